@@ -0,0 +1,67 @@
+from django.conf import settings
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+PROFILE_FIELDS = {
+    'id': 'id',
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+}
+
+
+class ApiError(Exception):
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def parse_fields(request, available):
+    """Поля из ?fields=a,b; по умолчанию все."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}.')
+    return fields
+
+
+def lookups(fields, available, required=()):
+    """Аргументы для values(): выбранные поля и поля ключа пагинации."""
+    names = [available[name] for name in fields]
+    return names + [name for name in required if name not in names]
+
+
+def serialize(rows, fields, available):
+    """Строки values() в словари с публичными именами полей."""
+    result = []
+    for row in rows:
+        item = {name: row[available[name]] for name in fields}
+        if 'image' in item:
+            item['image'] = (settings.MEDIA_URL + item['image']
+                             if item['image'] else None)
+        result.append(item)
+    return result
@@ -0,0 +1,270 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import heads, pagination
+from posts.models import Comment, Follow, Group, GroupFollow, Post
+
+User = get_user_model()
+
+NUMBER_OF_TEST_POSTS = 15
+
+
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.follower_user = User.objects.create_user(username='VasyaPupkin')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}', group=cls.group)
+            for i in range(NUMBER_OF_TEST_POSTS)
+        )
+        cls.post = Post.objects.latest('pub_date', 'id')
+        Comment.objects.create(post=cls.post, author=cls.follower_user,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.follower_user, author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower_user)
+
+    def test_crafted_cursor_rejected(self):
+        """Курсор с неверными типами значений даёт 400."""
+        url = reverse('api:post_list')
+        for values in (['2020-13-45T00:00:00', 1], [True, 1], [123, 1],
+                       ['2020-01-01T00:00:00+00:00', 2 ** 70]):
+            with self.subTest(values=values):
+                response = self.client.get(
+                    url, {'cursor': pagination.encode_cursor(values)})
+                self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_post_list_cursor_pagination(self):
+        """Список постов листается курсором без повторов."""
+        url = reverse('api:post_list')
+        first = self.client.get(url).json()
+        second = self.client.get(url, {'cursor': first['next']}).json()
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), NUMBER_OF_TEST_POSTS)
+        self.assertEqual(first['results'][0]['author'], self.user.username)
+        self.assertEqual(first['results'][0]['group'], self.group.slug)
+
+    def test_sparse_fields(self):
+        """?fields ограничивает набор полей в ответе."""
+        response = self.client.get(reverse('api:post_list'),
+                                   {'fields': 'id,text'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'text'})
+        response = self.client.get(reverse('api:post_list'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_multi_get(self):
+        """?ids возвращает посты в порядке запроса одним запросом к БД."""
+        ids = list(Post.objects.values_list('id', flat=True)[:3])[::-1]
+        url = reverse('api:post_list')
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                url, {'ids': ','.join(map(str, ids + [0]))})
+        self.assertEqual([post['id'] for post in response.json()['results']],
+                         ids)
+
+    def test_detail_endpoints(self):
+        """Пост, группа, профиль и комментарии отдаются в JSON."""
+        urls = {
+            reverse('api:post_detail', kwargs={'post_id': self.post.id}):
+                ('text', self.post.text),
+            reverse('api:group_detail', kwargs={'slug': self.group.slug}):
+                ('title', self.group.title),
+            reverse('api:profile_detail',
+                    kwargs={'username': self.user.username}):
+                ('username', self.user.username),
+        }
+        for url, (field, value) in urls.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).json()[field], value)
+        comments = self.client.get(reverse(
+            'api:post_comments', kwargs={'post_id': self.post.id})).json()
+        self.assertEqual(comments['results'][0]['author'],
+                         self.follower_user.username)
+
+    def test_not_found_is_json(self):
+        """Несуществующие объекты дают JSON 404."""
+        response = self.client.get(
+            reverse('api:group_posts', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertIn('detail', response.json())
+
+    def test_follow_endpoints(self):
+        """Подписки и лента подписок требуют авторизации."""
+        response = self.client.get(reverse('api:follow_feed'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        follows = self.authorized_client.get(reverse('api:follow_list'))
+        self.assertEqual(follows.json()['results'][0]['username'],
+                         self.user.username)
+        feed = self.authorized_client.get(reverse('api:follow_feed'))
+        self.assertEqual(len(feed.json()['results']), 10)
+        rest = self.authorized_client.get(
+            reverse('api:follow_feed'), {'cursor': feed.json()['next']})
+        self.assertEqual(len(rest.json()['results']), 5)
+        self.assertIsNone(rest.json()['next'])
+
+    def test_follow_feed_includes_groups(self):
+        """Лента подписок API совпадает с сайтом: авторы и группы."""
+        group = Group.objects.create(title='Другая', slug='other-slug',
+                                     description='Текст')
+        post = Post.objects.create(author=self.follower_user, text='Пост',
+                                   group=group)
+        url = reverse('api:follow_feed')
+        etag = self.authorized_client.get(url)['ETag']
+        GroupFollow.objects.create(user=self.follower_user, group=group)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['id'], post.id)
+
+    def test_invalid_ids_not_masked_by_etag(self):
+        """Неверные ids дают 400 даже с подходящим If-None-Match."""
+        # ETag страницы, зависящей только от версии site.
+        etag = self.client.get(reverse('api:group_list'))['ETag']
+        url = reverse('api:post_list')
+        response = self.client.get(url, {'ids': 'x'},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_profile_etag_follows_user_fields(self):
+        url = reverse('api:profile_detail',
+                      kwargs={'username': self.user.username})
+        etag = self.client.get(url)['ETag']
+        self.user.first_name = 'Иван'
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['first_name'], 'Иван')
+
+    def test_etag(self):
+        """Ответы API поддерживают If-None-Match."""
+        url = reverse('api:group_posts', kwargs={'slug': self.group.slug})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+class NewPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.follower_user = User.objects.create_user(username='VasyaPupkin')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост',
+                                       group=cls.group)
+        Follow.objects.create(user=cls.follower_user, author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower_user)
+        cache.clear()
+
+    def urls(self):
+        return {
+            reverse('api:index_new'): self.client,
+            reverse('api:group_new', kwargs={'slug': self.group.slug}):
+                self.client,
+            reverse('api:profile_new',
+                    kwargs={'username': self.user.username}): self.client,
+            reverse('api:follow_new'): self.authorized_client,
+        }
+
+    def test_new_posts_since_cursor(self):
+        """Лента отдаёт число и id постов новее курсора."""
+        new_post = Post.objects.create(author=self.user, text='Новый пост',
+                                       group=self.group)
+        for url, client in self.urls().items():
+            with self.subTest(url=url):
+                data = client.get(url, {'cursor': self.post.id}).json()
+                self.assertEqual(data, {'count': 1, 'ids': [new_post.id],
+                                        'head': new_post.id})
+
+    def test_no_new_posts_served_from_head_pointer(self):
+        """Без новых постов ответ не обращается к таблице постов."""
+        for url, client in self.urls().items():
+            with self.subTest(url=url):
+                head = client.get(url).json()['head']
+                self.assertEqual(head, self.post.id)
+        with self.assertNumQueries(0):
+            data = self.client.get(reverse('api:index_new'),
+                                   {'cursor': self.post.id}).json()
+        self.assertEqual(data['count'], 0)
+
+    def test_head_follows_delete_and_group_move(self):
+        """Удаление поста и перенос в другую группу сбрасывают указатели."""
+        other = Group.objects.create(title='Другая', slug='other-slug',
+                                     description='Текст')
+        new_post = Post.objects.create(author=self.user, text='Новый пост',
+                                       group=self.group)
+        group_url = reverse('api:group_new', kwargs={'slug': self.group.slug})
+        other_url = reverse('api:group_new', kwargs={'slug': other.slug})
+        self.client.get(other_url)
+        new_post.group = other
+        new_post.save()
+        self.assertEqual(self.client.get(group_url).json()['head'],
+                         self.post.id)
+        self.assertEqual(self.client.get(other_url).json()['head'],
+                         new_post.id)
+        new_post.delete()
+        heads = {reverse('api:index_new'): self.post.id, other_url: 0}
+        for url, head in heads.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).json()['head'], head)
+
+    def test_follow_new_counts_group_subscriptions(self):
+        """Дельта ленты подписок видит посты подписанных групп, как и
+        /follow/."""
+        group_reader = User.objects.create_user(username='GroupReader')
+        GroupFollow.objects.create(user=group_reader, group=self.group)
+        client = Client()
+        client.force_login(group_reader)
+        url = reverse('api:follow_new')
+        self.assertEqual(client.get(url).json()['head'], self.post.id)
+        new_post = Post.objects.create(author=self.user, text='Новый пост',
+                                       group=self.group)
+        data = client.get(url, {'cursor': self.post.id}).json()
+        self.assertEqual(data, {'count': 1, 'ids': [new_post.id],
+                                'head': new_post.id})
+
+    def test_follow_heads_loaded_in_chunks(self):
+        other = User.objects.create_user(username='Other')
+        other_post = Post.objects.create(author=other, text='Пост')
+        with mock.patch.object(heads, 'CHUNK_SIZE', 1):
+            found = heads.get_follow_heads(
+                [(self.user.id, self.user.username),
+                 (other.id, other.username)],
+                [(self.group.id, self.group.slug)])
+        self.assertEqual(found, {f'author:{self.user.username}': self.post.id,
+                                 f'author:{other.username}': other_post.id,
+                                 f'group:{self.group.slug}': self.post.id})
+
+    @override_settings(DELTA_POLL_INTERVAL=0.01)
+    def test_long_poll_timeout(self):
+        """Long-poll без новых постов завершается по таймауту."""
+        response = self.client.get(reverse('api:index_new'),
+                                   {'cursor': self.post.id, 'wait': 0.05})
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_bad_cursor(self):
+        """Нечисловой курсор даёт 400."""
+        response = self.client.get(reverse('api:index_new'),
+                                   {'cursor': 'abc'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,272 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.views.decorators.cache import never_cache
+
+from posts import heads
+from posts.decorators import conditional_page
+from posts.models import Comment, Group, Post
+from posts.pagination import InvalidCursor, keyset_page, merged_keyset_page
+from posts.views import (NUMBER_OF_POSTS_ON_PAGE, follow_keys, follow_posts,
+                         follow_streams, get_follow_sources, group_keys,
+                         post_keys, profile_keys)
+
+from .serializers import (COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS,
+                          PROFILE_FIELDS, ApiError, lookups, parse_fields,
+                          serialize)
+
+MAX_LIMIT = 100
+MAX_IDS = 100
+User = get_user_model()
+
+
+def api_view(view_func):
+    """Ошибки API отдаются в JSON, а не HTML-страницами."""
+    @wraps(view_func)
+    def inner(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'detail': error.detail},
+                                status=error.status)
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено.'}, status=404)
+    return inner
+
+
+def login_required_api(view_func):
+    @wraps(view_func)
+    def inner(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Требуется авторизация.'},
+                                status=401)
+        return view_func(request, *args, **kwargs)
+    return inner
+
+
+def get_limit(request):
+    value = request.GET.get('limit', '')
+    if not value:
+        return NUMBER_OF_POSTS_ON_PAGE
+    if not value.isdigit() or not 0 < int(value) <= MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {MAX_LIMIT}.')
+    return int(value)
+
+
+def get_ids(request):
+    try:
+        ids = [int(value) for value in request.GET['ids'].split(',')]
+    except ValueError:
+        raise ApiError('ids — список целых чисел через запятую.')
+    if len(ids) > MAX_IDS:
+        raise ApiError(f'Не больше {MAX_IDS} ids за запрос.')
+    return ids
+
+
+def paginated(request, queryset, available, key=('pub_date', 'id'),
+              streams=None):
+    """Страница values() по курсору: {"results": [...], "next": ...}.
+
+    Со streams страница — слияние выборок queryset.filter(stream).
+    """
+    fields = parse_fields(request, available)
+    rows = queryset.values(*lookups(fields, available, key))
+    cursor, limit = request.GET.get('cursor'), get_limit(request)
+    try:
+        if streams is None:
+            page = keyset_page(rows, cursor, limit, key)
+        else:
+            page = merged_keyset_page(rows, streams, cursor, limit, key)
+    except InvalidCursor:
+        raise ApiError('Неверный курсор.')
+    return JsonResponse({
+        'results': serialize(page, fields, available),
+        'next': page.next_cursor,
+    })
+
+
+def detail(request, queryset, available):
+    fields = parse_fields(request, available)
+    row = queryset.values(*lookups(fields, available)).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(serialize([row], fields, available)[0])
+
+
+def site_keys(request, *args, **kwargs):
+    return []
+
+
+def post_list_keys(request):
+    if 'ids' in request.GET:
+        # Неверные ids — ошибка 400 ещё до сравнения ETag.
+        return [f'post:{post_id}' for post_id in get_ids(request)]
+    return ['index']
+
+
+@api_view
+@conditional_page(post_list_keys)
+def post_list(request):
+    if 'ids' not in request.GET:
+        return paginated(request, Post.objects.all(), POST_FIELDS)
+    ids = get_ids(request)
+    fields = parse_fields(request, POST_FIELDS)
+    rows = Post.objects.filter(pk__in=ids).values(
+        *lookups(fields, POST_FIELDS, ('id',)))
+    by_id = {row['id']: row for row in rows}
+    found = [by_id[post_id] for post_id in ids if post_id in by_id]
+    return JsonResponse({'results': serialize(found, fields, POST_FIELDS)})
+
+
+@api_view
+@conditional_page(post_keys)
+def post_detail(request, post_id):
+    return detail(request, Post.objects.filter(pk=post_id), POST_FIELDS)
+
+
+@api_view
+@conditional_page(post_keys)
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return paginated(request, Comment.objects.filter(post_id=post_id),
+                     COMMENT_FIELDS, key=('created', 'id'))
+
+
+@api_view
+@conditional_page(site_keys)
+def group_list(request):
+    return paginated(request, Group.objects.all(), GROUP_FIELDS,
+                     key=('id',))
+
+
+@api_view
+@conditional_page(site_keys)
+def group_detail(request, slug):
+    return detail(request, Group.objects.filter(slug=slug), GROUP_FIELDS)
+
+
+@api_view
+@conditional_page(group_keys)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        raise Http404
+    return paginated(request, Post.objects.filter(group_id=group_id),
+                     POST_FIELDS)
+
+
+@api_view
+@conditional_page(profile_keys)
+def profile_detail(request, username):
+    return detail(request, User.objects.filter(username=username),
+                  PROFILE_FIELDS)
+
+
+@api_view
+@conditional_page(profile_keys)
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        raise Http404
+    return paginated(request, Post.objects.filter(author_id=author_id),
+                     POST_FIELDS)
+
+
+@api_view
+@login_required_api
+@conditional_page(follow_keys, public=False)
+def follow_list(request):
+    authors = User.objects.filter(following__user=request.user)
+    return paginated(request, authors, PROFILE_FIELDS, key=('id',))
+
+
+@api_view
+@login_required_api
+@conditional_page(follow_keys, public=False)
+def follow_feed(request):
+    return paginated(request, Post.objects.all(), POST_FIELDS,
+                     streams=follow_streams(request))
+
+
+def get_cursor(request):
+    value = request.GET.get('cursor', '0')
+    if not value.isdigit():
+        raise ApiError('cursor — id последнего известного поста.')
+    return int(value)
+
+
+def get_wait(request):
+    try:
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        raise ApiError('wait — число секунд.')
+    return min(max(wait, 0), settings.DELTA_POLL_MAX_WAIT)
+
+
+def new_posts(request, post_list, get_head):
+    """Число и id постов новее курсора.
+
+    Пока указатель ленты не новее курсора, ответ не трогает таблицу
+    постов; с ?wait=N запрос ждёт новых постов до N секунд.
+    """
+    cursor = get_cursor(request)
+    deadline = time.monotonic() + get_wait(request)
+    head = get_head()
+    while head <= cursor and time.monotonic() < deadline:
+        time.sleep(settings.DELTA_POLL_INTERVAL)
+        head = get_head()
+    if head <= cursor:
+        return JsonResponse({'count': 0, 'ids': [], 'head': cursor})
+    newer = post_list.filter(id__gt=cursor)
+    ids = list(newer.order_by('-id').values_list('id', flat=True)[:MAX_IDS])
+    count = len(ids) if len(ids) < MAX_IDS else newer.count()
+    return JsonResponse({'count': count, 'ids': ids, 'head': head})
+
+
+@never_cache
+@api_view
+def index_new(request):
+    post_list = Post.objects.all()
+    return new_posts(request, post_list,
+                     lambda: heads.get_head('index', post_list))
+
+
+@never_cache
+@api_view
+def group_new(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        raise Http404
+    post_list = Post.objects.filter(group_id=group_id)
+    return new_posts(request, post_list,
+                     lambda: heads.get_head(f'group:{slug}', post_list))
+
+
+@never_cache
+@api_view
+def profile_new(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        raise Http404
+    post_list = Post.objects.filter(author_id=author_id)
+    return new_posts(request, post_list,
+                     lambda: heads.get_head(f'author:{username}', post_list))
+
+
+@never_cache
+@api_view
+@login_required_api
+def follow_new(request):
+    authors, groups = get_follow_sources(request)
+    return new_posts(
+        request, follow_posts(request.user),
+        lambda: max(heads.get_follow_heads(authors, groups).values(),
+                    default=0))
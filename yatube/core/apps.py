@@ -1,5 +1,19 @@
+import signal
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import memory
+
+        if settings.MEMORY_TRACE:
+            memory.start_tracing()
+        if settings.MEMORY_REPORT_SIGNAL:
+            signal.signal(
+                getattr(signal, settings.MEMORY_REPORT_SIGNAL),
+                memory.log_report,
+            )
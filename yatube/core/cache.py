@@ -0,0 +1,34 @@
+import threading
+
+from django.core.cache.backends import locmem
+
+from .instrumentation import record_cache
+
+_MISSING = object()
+
+
+class CacheStatsMixin:
+    """Считает попадания и промахи кэша для текущего запроса."""
+
+    _local = threading.local()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if not getattr(self._local, 'in_get_many', False):
+            hit = value is not _MISSING
+            record_cache(int(hit), int(not hit))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        self._local.in_get_many = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            self._local.in_get_many = False
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(CacheStatsMixin, locmem.LocMemCache):
+    pass
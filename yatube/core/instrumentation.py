@@ -0,0 +1,112 @@
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from . import slow_queries
+
+_state = threading.local()
+
+
+class RequestStats:
+    """Счётчики, собираемые за время обработки одного запроса."""
+
+    __slots__ = (
+        'view_name', 'started', 'total_time', 'queries', 'db_time',
+        'template_time', 'template_depth', 'cache_hits', 'cache_misses',
+    )
+
+    def __init__(self):
+        self.view_name = ''
+        self.started = time.perf_counter()
+        self.total_time = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'total_ms': round(self.total_time * 1000, 2),
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            (f'cache;desc="hit={self.cache_hits} '
+             f'miss={self.cache_misses}"'),
+            f'total;dur={self.total_time * 1000:.2f}',
+        ))
+
+
+def current():
+    """Счётчики текущего запроса или None вне запроса."""
+    return getattr(_state, 'stats', None)
+
+
+def count_query(execute, sql, params, many, context):
+    stats = current()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            slow_queries.log.record(
+                sql, params, many, elapsed, context['connection'],
+                stats.view_name,
+            )
+
+
+@contextmanager
+def collect():
+    """Собирает RequestStats для кода внутри блока."""
+    stats = RequestStats()
+    _state.stats = stats
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            yield stats
+    finally:
+        stats.total_time = time.perf_counter() - stats.started
+        _state.stats = None
+
+
+@contextmanager
+def template_timer():
+    """Учитывает время рендеринга шаблона верхнего уровня."""
+    stats = current()
+    if stats is None or stats.template_depth:
+        yield
+        return
+    stats.template_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.template_time += time.perf_counter() - start
+        stats.template_depth -= 1
+
+
+def record_cache(hits, misses):
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
@@ -0,0 +1,63 @@
+import glob
+import os
+import pstats
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+FORMATS = ('prof', 'folded')
+
+
+class Command(BaseCommand):
+    help = 'Объединяет профили запросов за окно времени.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='prof',
+            help='prof — pstats, folded — collapsed stacks для flamegraph.')
+        parser.add_argument(
+            '--view', default='*',
+            help='Имя view, например posts:index; допускается glob.')
+        parser.add_argument(
+            '--since', type=float, default=60,
+            help='Начало окна, минут назад.')
+        parser.add_argument(
+            '--until', type=float, default=0,
+            help='Конец окна, минут назад.')
+
+    def handle(self, *args, **options):
+        now = time.time()
+        start = now - options['since'] * 60
+        end = now - options['until'] * 60
+        pattern = os.path.join(
+            settings.PROFILING_DIR,
+            options['view'].replace(':', '.'),
+            f'*.{options["format"]}',
+        )
+        paths = [
+            path for path in sorted(glob.glob(pattern))
+            if start <= os.path.getmtime(path) <= end
+        ]
+        if not paths:
+            raise CommandError('За указанное окно профилей нет.')
+        if options['format'] == 'prof':
+            pstats.Stats(*paths).dump_stats(options['output'])
+        else:
+            self.merge_folded(paths, options['output'])
+        self.stdout.write(
+            f'Объединено профилей: {len(paths)} -> {options["output"]}')
+
+    def merge_folded(self, paths, output):
+        stacks = Counter()
+        for path in paths:
+            with open(path) as folded:
+                for line in folded:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack:
+                        stacks[stack] += int(count)
+        with open(output, 'w') as merged:
+            for stack, count in sorted(stacks.items()):
+                merged.write(f'{stack} {count}\n')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = 'Выдаёт подписанное значение заголовка X-Profile.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core import slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Показывает самые тяжёлые запросы по суммарному времени.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        entries = slow_queries.collect()[:options['limit']]
+        if not entries:
+            self.stdout.write('Медленных запросов не найдено.')
+            return
+        for number, entry in enumerate(entries, start=1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{number}. [{entry["fingerprint"]}] '
+                f'total={entry["total"] * 1000:.1f}ms '
+                f'count={entry["count"]} '
+                f'max={entry["max"] * 1000:.1f}ms'
+            ))
+            self.stdout.write(f'   view:   {entry.get("view", "")}')
+            self.stdout.write(f'   frame:  {entry.get("frame", "")}')
+            self.stdout.write(f'   sql:    {entry["sql"]}')
+            self.stdout.write(
+                f'   params: {", ".join(entry.get("params", []))}')
+            for line in entry['plan'].splitlines():
+                self.stdout.write(f'   plan:   {line}')
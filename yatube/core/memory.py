@@ -0,0 +1,92 @@
+import gc
+import logging
+import os
+import resource
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.db.models.query import QuerySet
+from django.template.base import Template
+
+try:
+    from PIL.Image import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger('yatube.memory')
+
+_baseline = None
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Вне Linux доступен только пиковый RSS (в килобайтах).
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def start_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+        reset_baseline()
+
+
+def reset_baseline():
+    global _baseline
+    _baseline = take_snapshot()
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+
+
+def live_objects():
+    """Число живых объектов отслеживаемых типов и самых частых типов."""
+    tracked = {'QuerySet': QuerySet, 'Template': Template}
+    if Image is not None:
+        tracked['PIL.Image'] = Image
+    counts = Counter()
+    by_type = Counter()
+    for obj in gc.get_objects():
+        # type(), а не isinstance(): isinstance вычислил бы ленивые объекты.
+        obj_type = type(obj)
+        by_type[obj_type.__qualname__] += 1
+        for name, cls in tracked.items():
+            if issubclass(obj_type, cls):
+                counts[name] += 1
+    return {name: counts[name] for name in tracked}, by_type
+
+
+def report(limit=20):
+    """Текстовый отчёт: рост аллокаций от базового снимка и живые объекты."""
+    lines = [f'RSS: {current_rss() / 2 ** 20:.1f} MiB']
+    if tracemalloc.is_tracing():
+        snapshot = take_snapshot()
+        if _baseline is not None:
+            stats = snapshot.compare_to(_baseline, 'lineno')
+            lines.append(f'Top {limit} allocation sites since baseline:')
+        else:
+            stats = snapshot.statistics('lineno')
+            lines.append(f'Top {limit} allocation sites:')
+        lines.extend(f'  {stat}' for stat in stats[:limit])
+    else:
+        lines.append('tracemalloc is not tracing.')
+    tracked, by_type = live_objects()
+    lines.append('Live objects:')
+    lines.extend(f'  {name}: {count}' for name, count in tracked.items())
+    lines.append(f'Top {limit} types by count:')
+    lines.extend(
+        f'  {name}: {count}' for name, count in by_type.most_common(limit))
+    return '\n'.join(lines)
+
+
+def log_report(signum, frame):
+    logger.warning('memory report pid=%s\n%s', os.getpid(), report())
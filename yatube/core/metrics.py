@@ -0,0 +1,214 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from .spool import Spool
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+THUMBNAIL_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+    def empty_copy(self):
+        return Counter(self.name, self.documentation, self.labelnames)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def merge(self, labels, value):
+        labels = tuple(labels)
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield '', self._labels(labels), value
+
+    def _labels(self, labels, **extra):
+        pairs = list(zip(self.labelnames, labels)) + list(extra.items())
+        return {name: value for name, value in pairs}
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def empty_copy(self):
+        return Histogram(
+            self.name, self.documentation, self.labelnames, self.buckets)
+
+    def observe(self, value, *labels):
+        state = self.values.setdefault(
+            labels, [0] * (len(self.buckets) + 1) + [0.0])
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def merge(self, labels, value):
+        state = self.values.setdefault(
+            tuple(labels), [0] * (len(self.buckets) + 1) + [0.0])
+        for index, amount in enumerate(value):
+            state[index] += amount
+
+    def samples(self):
+        for labels, state in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield '_bucket', self._labels(labels, le=f'{bound}'), (
+                    cumulative)
+            count = cumulative + state[len(self.buckets)]
+            yield '_bucket', self._labels(labels, le='+Inf'), count
+            yield '_sum', self._labels(labels), state[-1]
+            yield '_count', self._labels(labels), count
+
+
+class Registry:
+    """Метрики процесса с периодическим сбросом в общий спул."""
+
+    def __init__(self, spool):
+        self.spool = spool
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.last_flush = 0.0
+        self.pid_key = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.values = {}
+
+    def _ensure_process(self):
+        # После fork счётчики родителя принадлежат его файлу в спуле.
+        if self.pid_key != self.spool.process_key():
+            self.pid_key = self.spool.process_key()
+            self.reset()
+
+    def update(self, func, *args):
+        with self.lock:
+            self._ensure_process()
+            func(*args)
+            now = time.monotonic()
+            if now - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+                self._flush()
+                self.last_flush = now
+
+    def flush(self):
+        with self.lock:
+            self._ensure_process()
+            self._flush()
+
+    def _flush(self):
+        self.spool.write(self._snapshot(self.metrics))
+
+    def _snapshot(self, metrics):
+        return {
+            name: [[list(labels), value]
+                   for labels, value in metric.values.items()]
+            for name, metric in metrics.items()
+        }
+
+    def _merge(self, snapshots):
+        merged = {
+            name: metric.empty_copy()
+            for name, metric in self.metrics.items()
+        }
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                if name not in merged:
+                    continue
+                for labels, value in values:
+                    merged[name].merge(labels, value)
+        return merged
+
+    def collect(self):
+        """Суммирует снимки всех процессов в новые объекты метрик."""
+        self.flush()
+        self.spool.compact(
+            lambda snapshots: self._snapshot(self._merge(snapshots)))
+        return self._merge(self.spool.read_all()).values()
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def render_text(metrics):
+    """Текстовый формат экспозиции Prometheus."""
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for suffix, labels, value in metric.samples():
+            label_text = ','.join(
+                f'{name}="{_escape(label)}"' for name, label in labels.items()
+            )
+            if label_text:
+                label_text = '{' + label_text + '}'
+            lines.append(f'{metric.name}{suffix}{label_text} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(Spool('metrics'))
+requests_total = registry.register(Counter(
+    'yatube_requests_total', 'Обработанные запросы.',
+    ('view', 'method', 'status'),
+))
+request_duration = registry.register(Histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса.',
+    ('view',), LATENCY_BUCKETS,
+))
+request_queries = registry.register(Histogram(
+    'yatube_request_db_queries', 'Число SQL-запросов на запрос.',
+    ('view',), QUERY_BUCKETS,
+))
+request_db_duration = registry.register(Histogram(
+    'yatube_request_db_duration_seconds', 'Время в БД на запрос.',
+    ('view',), LATENCY_BUCKETS,
+))
+cache_requests = registry.register(Counter(
+    'yatube_cache_requests_total', 'Обращения к кэшу по результату.',
+    ('result',),
+))
+thumbnail_duration = registry.register(Histogram(
+    'yatube_thumbnail_generation_seconds', 'Время генерации миниатюры.',
+    (), THUMBNAIL_BUCKETS,
+))
+
+
+def _observe_request(stats, method, status):
+    view = stats.view_name
+    requests_total.inc(view, method, str(status))
+    request_duration.observe(stats.total_time, view)
+    request_queries.observe(stats.queries, view)
+    request_db_duration.observe(stats.db_time, view)
+    if stats.cache_hits:
+        cache_requests.inc('hit', amount=stats.cache_hits)
+    if stats.cache_misses:
+        cache_requests.inc('miss', amount=stats.cache_misses)
+
+
+def observe_request(stats, method, status):
+    registry.update(_observe_request, stats, method, status)
+
+
+def observe_thumbnail(seconds):
+    registry.update(thumbnail_duration.observe, seconds)
@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import random
+import signal
+
+from django.conf import settings
+from django.core.signals import request_finished
+
+from . import instrumentation, memory, metrics, profiling
+from .signals import worker_recycling
+
+logger = logging.getLogger('yatube.requests')
+
+
+class RequestTimingMiddleware:
+    """Замеряет запрос: SQL, шаблоны, кэш и общее время.
+
+    Результат отдаётся в заголовке Server-Timing, а медленные запросы
+    пишутся в лог одной JSON-строкой.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with instrumentation.collect() as stats:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        stats.view_name = match.view_name if match else '<unresolved>'
+        response['Server-Timing'] = stats.server_timing()
+        metrics.observe_request(stats, request.method, response.status_code)
+        if stats.total_time * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            record = stats.as_dict()
+            record.update(
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+            )
+            logger.warning(
+                'slow_request %s', json.dumps(record, sort_keys=True),
+                extra={'request_stats': record},
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = instrumentation.current()
+        if stats is not None:
+            stats.view_name = request.resolver_match.view_name
+
+
+class SamplingProfilerMiddleware:
+    """Профилирует выборку запросов (PROFILING_SAMPLE_RATE) и запросы
+    с подписанным заголовком X-Profile."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.should_profile(request):
+            return self.get_response(request)
+        with profiling.Profile() as profile:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        profile.save(match.view_name if match else '')
+        return response
+
+
+class WorkerRecycleMiddleware:
+    """Завершает воркер после WORKER_MAX_REQUESTS запросов или при RSS
+    больше WORKER_MAX_RSS_MB, чтобы менеджер процессов поднял новый.
+
+    SIGTERM отправляется после отдачи ответа, поэтому текущий запрос
+    завершается штатно. Перед ним рассылается worker_recycling, чтобы
+    приложения сбросили буферы процесса.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.requests = 0
+        self.max_requests = settings.WORKER_MAX_REQUESTS
+        if self.max_requests and settings.WORKER_MAX_REQUESTS_JITTER:
+            # Разброс, чтобы воркеры не перезапускались одновременно.
+            self.max_requests += random.randint(
+                0, settings.WORKER_MAX_REQUESTS_JITTER)
+        self.recycling = False
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        self.requests += 1
+        if not self.recycling:
+            reason = self.recycle_reason()
+            if reason:
+                self.recycling = True
+                memory.logger.warning(
+                    'recycling worker pid=%s: %s', os.getpid(), reason)
+                request_finished.connect(
+                    self.terminate, dispatch_uid='core.worker_recycle')
+        return response
+
+    def recycle_reason(self):
+        if self.max_requests and self.requests >= self.max_requests:
+            return f'{self.requests} requests served'
+        max_rss = settings.WORKER_MAX_RSS_MB
+        if max_rss:
+            rss = memory.current_rss() / 2 ** 20
+            if rss >= max_rss:
+                return f'RSS {rss:.0f} MiB >= {max_rss} MiB'
+        return ''
+
+    @staticmethod
+    def terminate(**kwargs):
+        request_finished.disconnect(dispatch_uid='core.worker_recycle')
+        worker_recycling.send(sender=WorkerRecycleMiddleware)
+        os.kill(os.getpid(), signal.SIGTERM)
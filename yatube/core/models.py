@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class ContentVersion(models.Model):
+    """Счётчик версии произвольного ключа контента.
+
+    Увеличивается при каждом изменении данных, от которых зависит
+    страница, и служит дешёвым валидатором для условных запросов.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    version = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.key}={self.version}'
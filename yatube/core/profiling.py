@@ -0,0 +1,123 @@
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'core.profiling'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+
+def make_token():
+    """Подписанное значение заголовка X-Profile."""
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+def has_valid_token(request):
+    token = request.META.get(PROFILE_HEADER)
+    if not token:
+        return False
+    try:
+        signing.loads(token, salt=TOKEN_SALT,
+                      max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def should_profile(request):
+    """Профилируется каждый N-й запрос или запрос с подписанным токеном."""
+    rate = settings.PROFILING_SAMPLE_RATE
+    if rate and random.randrange(rate) == 0:
+        return True
+    return has_valid_token(request)
+
+
+def frame_name(frame):
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{frame.f_code.co_name}'
+
+
+def collapse(frame):
+    """Стек кадра в формате collapsed stacks: от корня к листу через ;."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Фоновый поток, периодически снимающий стек заданного потока."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def output_path(view_name, extension):
+    directory = os.path.join(
+        settings.PROFILING_DIR, view_name.replace(':', '.') or 'unresolved')
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%S')
+    return os.path.join(
+        directory,
+        f'{stamp}-{os.getpid()}-{random.getrandbits(32):08x}.{extension}',
+    )
+
+
+class Profile:
+    """Профиль одного запроса в режиме PROFILING_MODE."""
+
+    def __init__(self):
+        self.mode = settings.PROFILING_MODE
+        if self.mode == 'sampler':
+            self.profiler = StackSampler(
+                threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+        else:
+            self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        if self.mode == 'sampler':
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mode == 'sampler':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def save(self, view_name):
+        if self.mode == 'sampler':
+            path = output_path(view_name, 'folded')
+            with open(path, 'w') as folded:
+                for stack, count in self.profiler.stacks.items():
+                    folded.write(f'{stack} {count}\n')
+        else:
+            path = output_path(view_name, 'prof')
+            self.profiler.dump_stats(path)
+        return path
@@ -0,0 +1,21 @@
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TempSpoolRunner(DiscoverRunner):
+    """Запуск тестов с SPOOL_DIR во временном каталоге: метрики и журнал
+    медленных запросов тестов не смешиваются с рабочими."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.spool_dir = tempfile.mkdtemp()
+        self.spool_settings = override_settings(SPOOL_DIR=self.spool_dir)
+        self.spool_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.spool_settings.disable()
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Воркер сейчас получит SIGTERM: пора сбросить буферы процесса.
+worker_recycling = Signal()
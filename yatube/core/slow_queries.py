@@ -0,0 +1,131 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import traceback
+
+from django.conf import settings
+
+from .spool import Spool
+
+MAX_PARAM_LENGTH = 200
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+_SKIP_FILES = ('instrumentation.py', 'slow_queries.py')
+
+
+def normalize(sql):
+    """SQL без литералов: одинаковые запросы дают одинаковую строку."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:16]
+
+
+def origin_frame():
+    """Ближайший к запросу кадр стека из кода проекта."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (not filename.startswith(settings.BASE_DIR)
+                or filename.endswith(_SKIP_FILES)):
+            continue
+        path = os.path.relpath(filename, settings.BASE_DIR)
+        return f'{path}:{frame.lineno} in {frame.name}'
+    return ''
+
+
+def explain(connection, sql, params):
+    """Вывод EXPLAIN QUERY PLAN для SELECT в SQLite."""
+    if (connection.vendor != 'sqlite'
+            or not sql.lstrip().upper().startswith(('SELECT', 'WITH'))):
+        return ''
+    # Курсор без CursorWrapper: EXPLAIN не попадает в счётчики запроса.
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except sqlite3.Error:
+        return ''
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """Дедуплицированный по отпечатку журнал медленных запросов процесса."""
+
+    def __init__(self, spool):
+        self.spool = spool
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.pid_key = None
+
+    def record(self, sql, params, many, elapsed, connection, view_name):
+        key = fingerprint(sql)
+        with self.lock:
+            if self.pid_key != self.spool.process_key():
+                self.pid_key = self.spool.process_key()
+                self.entries = {}
+            is_new = key not in self.entries
+        plan = '' if many or not is_new else explain(connection, sql, params)
+        sample_params = [] if many else [
+            repr(param)[:MAX_PARAM_LENGTH] for param in params or ()
+        ]
+        with self.lock:
+            entry = self.entries.setdefault(key, {
+                'fingerprint': key,
+                'sql': normalize(sql),
+                'count': 0,
+                'total': 0.0,
+                'max': 0.0,
+                'plan': plan,
+            })
+            entry['count'] += 1
+            entry['total'] += elapsed
+            if elapsed >= entry['max']:
+                entry.update(
+                    max=elapsed,
+                    sample_sql=sql,
+                    params=sample_params,
+                    view=view_name,
+                    frame=origin_frame(),
+                )
+            # Медленные запросы редки, поэтому снимок пишется сразу.
+            self.spool.write(self.entries)
+
+
+log = SlowQueryLog(Spool('slow_queries'))
+
+
+def merge(snapshots):
+    """Объединяет журналы процессов по отпечатку запроса."""
+    merged = {}
+    for snapshot in snapshots:
+        for key, entry in snapshot.items():
+            total = merged.get(key)
+            if total is None:
+                merged[key] = dict(entry)
+                continue
+            total['count'] += entry['count']
+            total['total'] += entry['total']
+            if entry['max'] > total['max']:
+                plan = total['plan'] or entry['plan']
+                total.update(entry, count=total['count'],
+                             total=total['total'], plan=plan)
+    return merged
+
+
+def collect():
+    """Журналы всех процессов, самые затратные запросы первыми."""
+    log.spool.compact(merge)
+    return sorted(merge(log.spool.read_all()).values(),
+                  key=lambda item: item['total'], reverse=True)
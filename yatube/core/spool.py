@@ -0,0 +1,137 @@
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Сводный снимок завершившихся процессов.
+FINISHED = 'finished.json'
+
+
+def _process_alive(name):
+    """Жив ли процесс, записавший файл <pid>-<токен>.json.
+
+    Файлы без pid в имени считаются живыми: их сворачивать не нам.
+    """
+    try:
+        pid = int(name.split('-', 1)[0])
+    except ValueError:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Spool:
+    """Каталог, в который каждый процесс пишет свой снимок состояния.
+
+    Файл процесса перезаписывается атомарно, поэтому читатель всегда
+    видит целый снимок. Снимки завершившихся процессов compact сливает
+    в один файл, чтобы накопительные счётчики не уменьшались, а каталог
+    не рос при перезапуске воркеров.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._pid = None
+        self._token = None
+
+    @property
+    def directory(self):
+        return os.path.join(settings.SPOOL_DIR, self.name)
+
+    def process_key(self):
+        """Уникальный ключ процесса; меняется после fork."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._token = f'{self._pid}-{uuid.uuid4().hex[:8]}'
+        return self._token
+
+    def write(self, data):
+        self._write(f'{self.process_key()}.json', data)
+
+    def _write(self, name, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as tmp:
+                json.dump(data, tmp)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def _locked(self, operation):
+        # Свёртка переносит снимки между файлами; читатель не должен
+        # увидеть снимок дважды или не увидеть вовсе.
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, operation)
+            yield
+
+    def _load(self, name):
+        with open(os.path.join(self.directory, name)) as spool_file:
+            return json.load(spool_file)
+
+    def _finished(self):
+        try:
+            return self._load(FINISHED)
+        except (OSError, ValueError):
+            return {'files': [], 'data': None}
+
+    def _process_files(self):
+        names = (os.path.basename(path) for path in
+                 glob.glob(os.path.join(self.directory, '*.json')))
+        return [name for name in names if name != FINISHED]
+
+    def _read(self, names):
+        for name in names:
+            try:
+                yield self._load(name)
+            except (OSError, ValueError):
+                continue
+
+    def read_all(self):
+        with self._locked(fcntl.LOCK_SH):
+            finished = self._finished()
+            merged = set(finished['files'])
+            snapshots = [] if finished['data'] is None else [finished['data']]
+            snapshots.extend(self._read(
+                name for name in self._process_files()
+                if name not in merged))
+        return snapshots
+
+    def compact(self, merge):
+        """Сливает снимки завершившихся процессов в FINISHED.
+
+        merge(snapshots) возвращает один снимок из нескольких. FINISHED
+        помнит, какие файлы в него вошли: если процесс упадёт до их
+        удаления, следующая свёртка удалит их, не учитывая повторно.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            finished = self._finished()
+            self._unlink(finished['files'])
+            dead = [name for name in self._process_files()
+                    if not _process_alive(name)]
+            if not dead:
+                return
+            snapshots = [] if finished['data'] is None else [finished['data']]
+            snapshots.extend(self._read(dead))
+            self._write(FINISHED, {'files': dead, 'data': merge(snapshots)})
+            self._unlink(dead)
+
+    def _unlink(self, names):
+        for name in names:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
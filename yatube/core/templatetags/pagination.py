@@ -0,0 +1,31 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2, on_ends=1):
+    """Номера страниц для пагинатора: края и соседи текущей.
+
+    Пропуск обозначается None. Полный page_range не создаётся, поэтому
+    время рендеринга не зависит от числа страниц.
+    """
+    num_pages = page_obj.paginator.num_pages
+    number = page_obj.number
+    ranges = (
+        (1, min(on_ends, num_pages)),
+        (max(number - on_each_side, 1),
+         min(number + on_each_side, num_pages)),
+        (max(num_pages - on_ends + 1, 1), num_pages),
+    )
+    pages = []
+    last = 0
+    for start, end in ranges:
+        start = max(start, last + 1)
+        if start > end:
+            continue
+        if start > last + 1:
+            pages.append(None)
+        pages.extend(range(start, end + 1))
+        last = end
+    return pages
@@ -1,4 +1,35 @@
-from django.test import TestCase
+import glob
+import json
+import os
+import pstats
+import subprocess
+import sys
+import tracemalloc
+from unittest import mock
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.test import TestCase, override_settings
+
+from posts.models import Group
+
+from . import metrics, slow_queries, versions
+from .profiling import collapse, make_token
+from .slow_queries import fingerprint
+from .spool import FINISHED, Spool
+from .templatetags.pagination import page_window
+
+TEMP_SPOOL_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_SPOOL_DIR, ignore_errors=True)
 
 
 class CoreURLTests(TestCase):
@@ -7,3 +38,287 @@ class CoreURLTests(TestCase):
         """Страница /unexisting_page/ использует соответствующий шаблон."""
         self.assertTemplateUsed(self.client.get('/unexisting_page/'),
                                 'core/404.html')
+
+
+class RequestTimingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит заголовок Server-Timing со всеми метриками."""
+        response = self.client.get('/')
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+
+    def test_cache_hits_counted(self):
+        """Повторный запрос к кэшированной странице даёт попадание."""
+        self.client.get('/')
+        response = self.client.get('/')
+        self.assertNotIn('hit=0 ', response['Server-Timing'])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_logged(self):
+        """Медленный запрос пишется в лог с именем view."""
+        with self.assertLogs('yatube.requests', 'WARNING') as logs:
+            self.client.get('/')
+        self.assertIn('"view": "posts:index"', logs.output[0])
+        self.assertIn('"queries":', logs.output[0])
+
+
+@override_settings(SPOOL_DIR=TEMP_SPOOL_DIR)
+class MetricsTests(TestCase):
+
+    def test_metrics_exposition(self):
+        """/metrics отдаёт счётчики и гистограммы по view."""
+        self.client.get('/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      content)
+        self.assertIn('yatube_requests_total{view="posts:index",'
+                      'method="GET",status="200"}', content)
+        self.assertIn('yatube_request_db_queries_bucket{view="posts:index",'
+                      'le="+Inf"}', content)
+
+    def test_metrics_merge_processes(self):
+        """Снимки других процессов из спула суммируются."""
+        directory = os.path.join(TEMP_SPOOL_DIR, 'metrics')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'other.json'), 'w') as other:
+            json.dump({'yatube_requests_total': [
+                [['other:view', 'GET', '200'], 7],
+            ]}, other)
+        content = self.client.get('/metrics').content.decode()
+        self.assertIn('yatube_requests_total{view="other:view",'
+                      'method="GET",status="200"} 7', content)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_hidden_from_public(self):
+        """/metrics недоступен с посторонних адресов."""
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+@override_settings(SPOOL_DIR=TEMP_SPOOL_DIR, SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        get_user_model().objects.create_user(username='auth')
+
+    def test_fingerprint_ignores_literals(self):
+        """Запросы, отличающиеся только параметрами, совпадают."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND a = 1'),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND a = 'x'"),
+        )
+
+    def test_slow_queries_command(self):
+        """Команда выводит запрос с view, кадром стека и планом."""
+        self.client.get(f'/group/{self.group.slug}/')
+        out = StringIO()
+        call_command('slow_queries', limit=50, stdout=out)
+        output = out.getvalue()
+        self.assertIn('view:   posts:group_slug', output)
+        self.assertIn('posts/views.py', output)
+        self.assertIn('plan:   SEARCH', output)
+
+
+class SpoolCompactionTests(TestCase):
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp(dir=TEMP_SPOOL_DIR)
+        self.settings_override = override_settings(SPOOL_DIR=spool_dir)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.registry = metrics.Registry(Spool('metrics'))
+        self.counter = self.registry.register(
+            metrics.Counter('requests', 'Запросы.', ('view',)))
+        self.directory = self.registry.spool.directory
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def write(self, name, value):
+        self.registry.spool._write(name, {'requests': [[['index'], value]]})
+
+    def total(self):
+        counters = {metric.name: metric for metric in self.registry.collect()}
+        return counters['requests'].values.get(('index',), 0)
+
+    def files(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_dead_processes_folded(self):
+        """Файлы завершившихся процессов сворачиваются в один, сумма
+        счётчиков не меняется."""
+        pid = self.dead_pid()
+        self.write(f'{pid}-aaaa.json', 2)
+        self.write(f'{pid}-bbbb.json', 3)
+        self.write(f'{os.getpid()}-live.json', 5)
+        self.assertEqual(self.total(), 10)
+        self.assertNotIn(f'{pid}-aaaa.json', self.files())
+        self.assertNotIn(f'{pid}-bbbb.json', self.files())
+        self.assertIn(f'{os.getpid()}-live.json', self.files())
+        self.write(f'{self.dead_pid()}-cccc.json', 7)
+        self.assertEqual(self.total(), 17)
+        process_files = [name for name in self.files()
+                         if name.endswith('.json') and name != FINISHED]
+        self.assertEqual(len(process_files), 2)
+
+    def test_interrupted_compaction_not_counted_twice(self):
+        """Файл, уже вошедший в сводку, но не удалённый, не считается
+        повторно и удаляется следующей свёрткой."""
+        name = f'{self.dead_pid()}-aaaa.json'
+        self.write(name, 2)
+        self.registry.spool._write(FINISHED, {
+            'files': [name], 'data': {'requests': [[['index'], 2]]}})
+        self.assertEqual(self.total(), 2)
+        self.assertNotIn(name, self.files())
+
+    def test_slow_queries_folded(self):
+        """Журналы завершившихся процессов объединяются по отпечатку."""
+        spool = Spool('slow_queries')
+        entry = {'fingerprint': 'f', 'sql': 'SELECT', 'count': 1,
+                 'total': 1.0, 'max': 1.0, 'plan': ''}
+        spool._write(f'{self.dead_pid()}-aaaa.json', {'f': entry})
+        spool._write(f'{self.dead_pid()}-bbbb.json', {'f': entry})
+        with mock.patch.object(slow_queries.log, 'spool', spool):
+            [merged] = slow_queries.collect()
+        self.assertEqual(merged['count'], 2)
+        self.assertEqual(glob.glob(os.path.join(spool.directory, '*.json')),
+                         [os.path.join(spool.directory, FINISHED)])
+
+
+class TestRunnerTests(TestCase):
+
+    def test_test_run_uses_temp_spool(self):
+        """Тесты не пишут в рабочий каталог спула."""
+        self.assertNotEqual(settings.SPOOL_DIR,
+                            os.path.join(settings.BASE_DIR, 'spool'))
+
+
+@override_settings(PROFILING_DIR=os.path.join(TEMP_SPOOL_DIR, 'profiles'))
+class SamplingProfilerTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def profiles(self, extension='prof'):
+        return glob.glob(os.path.join(
+            settings.PROFILING_DIR, 'posts.index', f'*.{extension}'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_profiled(self):
+        """При частоте 1 каждый запрос сохраняет pstats-профиль."""
+        self.client.get('/')
+        self.client.get('/')
+        self.assertEqual(len(self.profiles()), 2)
+        output = os.path.join(TEMP_SPOOL_DIR, 'merged.prof')
+        call_command('merge_profiles', output, view='posts:index',
+                     stdout=StringIO())
+        self.assertTrue(pstats.Stats(output).total_calls)
+
+    def test_signed_header(self):
+        """Без выборки профилируются только запросы с верной подписью."""
+        before = len(self.profiles())
+        self.client.get('/', HTTP_X_PROFILE='forged')
+        self.assertEqual(len(self.profiles()), before)
+        self.client.get('/', HTTP_X_PROFILE=make_token())
+        self.assertEqual(len(self.profiles()), before + 1)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MODE='sampler')
+    def test_sampler_writes_collapsed_stacks(self):
+        """Семплер пишет файл collapsed stacks."""
+        self.client.get('/')
+        self.assertEqual(len(self.profiles('folded')), 1)
+
+    def test_collapse(self):
+        """Стек сворачивается от корня к текущей функции."""
+        stack = collapse(sys._getframe())
+        self.assertTrue(stack.endswith('core.tests:test_collapse'))
+        self.assertIn(';', stack)
+
+
+class MemoryReportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = get_user_model().objects.create_user(
+            username='admin', is_staff=True)
+        cls.user = get_user_model().objects.create_user(username='auth')
+
+    def tearDown(self):
+        tracemalloc.stop()
+
+    def test_memory_report_staff_only(self):
+        """Отчёт о памяти доступен только персоналу."""
+        self.client.force_login(self.user)
+        response = self.client.get('/debug/memory/')
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get('/debug/memory/?start=1&limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'since baseline')
+        self.assertContains(response, 'QuerySet:')
+        self.assertContains(response, 'PIL.Image:')
+
+
+class WorkerRecycleMiddlewareTests(TestCase):
+
+    @override_settings(WORKER_MAX_REQUESTS=2)
+    def test_recycle_after_max_requests(self):
+        """Воркер получает SIGTERM после лимита запросов."""
+        with mock.patch('core.middleware.os.kill') as kill:
+            with self.assertLogs('yatube.memory', 'WARNING'):
+                self.client.get('/about/author/')
+                kill.assert_not_called()
+                self.client.get('/about/author/')
+            kill.assert_called_once()
+
+    def test_recycle_disabled_by_default(self):
+        """Без настроек воркер не перезапускается."""
+        with mock.patch('core.middleware.os.kill') as kill:
+            for _ in range(3):
+                self.client.get('/about/author/')
+        kill.assert_not_called()
+
+
+class PageWindowTests(TestCase):
+
+    def window(self, number, num_pages):
+        paginator = Paginator(range(num_pages * 10), 10)
+        return page_window(paginator.page(number))
+
+    def test_window_with_gaps(self):
+        """Пагинатор показывает края и соседей текущей страницы."""
+        self.assertEqual(self.window(500, 20000),
+                         [1, None, 498, 499, 500, 501, 502, None, 20000])
+
+    def test_window_near_edges(self):
+        """У краёв пропусков нет там, где страницы идут подряд."""
+        self.assertEqual(self.window(1, 20000), [1, 2, 3, None, 20000])
+        self.assertEqual(self.window(4, 20000),
+                         [1, 2, 3, 4, 5, 6, None, 20000])
+        self.assertEqual(self.window(3, 5), [1, 2, 3, 4, 5])
+        self.assertEqual(self.window(1, 1), [1])
+
+
+class VersionsTests(TestCase):
+    def test_many_keys(self):
+        """Ключей больше лимита параметров SQLite."""
+        keys = [f'author:user{number}' for number in range(1200)]
+        versions.bump(*keys)
+        found = versions.get_versions(keys)
+        self.assertEqual(len(found), len(keys))
+        self.assertEqual({version for version, _ in found.values()}, {1})
@@ -0,0 +1,18 @@
+import time
+
+from sorl.thumbnail import base
+
+from . import metrics
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, замеряющий генерацию миниатюр."""
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        start = time.perf_counter()
+        try:
+            return super()._create_thumbnail(
+                source_image, geometry_string, options, thumbnail)
+        finally:
+            metrics.observe_thumbnail(time.perf_counter() - start)
@@ -0,0 +1,49 @@
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ContentVersion
+
+# Ключи в IN читаются пачками: у SQLite лимит в 999 параметров, а лента
+# подписок проверяет ключ каждого автора и группы.
+CHUNK_SIZE = 500
+
+
+def chunks(keys):
+    for start in range(0, len(keys), CHUNK_SIZE):
+        yield keys[start:start + CHUNK_SIZE]
+
+
+def bump(*keys):
+    """Увеличивает версии ключей, создавая недостающие."""
+    keys = sorted({key for key in keys if key})
+    if not keys:
+        return
+    ContentVersion.objects.bulk_create(
+        [ContentVersion(key=key) for key in keys], ignore_conflicts=True)
+    modified = timezone.now()
+    for chunk in chunks(keys):
+        ContentVersion.objects.filter(key__in=chunk).update(
+            version=F('version') + 1, modified=modified)
+
+
+def get_versions(keys):
+    """Словарь ключ -> (версия, время изменения) для известных ключей."""
+    keys = list(keys)
+    return {
+        key: (version, modified)
+        for chunk in chunks(keys)
+        for key, version, modified in ContentVersion.objects.filter(
+            key__in=chunk).values_list('key', 'version', 'modified')
+    }
+
+
+def make_etag(keys, versions, *extra):
+    parts = [f'{key}={versions.get(key, (0,))[0]}' for key in sorted(keys)]
+    parts.extend(str(item) for item in extra)
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def last_modified(versions):
+    return max((modified for _, modified in versions.values()), default=None)
@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import memory as memory_stats
+from . import metrics as metrics_registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -7,3 +13,24 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics_registry.render_text(metrics_registry.registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def memory(request):
+    if 'start' in request.GET:
+        memory_stats.start_tracing()
+    if 'baseline' in request.GET:
+        memory_stats.reset_baseline()
+    limit = request.GET.get('limit', '')
+    limit = int(limit) if limit.isdigit() else 20
+    return HttpResponse(memory_stats.report(limit),
+                        content_type='text/plain; charset=utf-8')
@@ -0,0 +1,9 @@
+from . import unread as unread_posts
+
+
+def unread(request):
+    """Число непрочитанных постов ленты подписок для шапки."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_count': unread_posts.get_unread(user)}
@@ -0,0 +1,157 @@
+import datetime
+from functools import wraps
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+
+from core import versions
+
+from . import unread, view_counts
+
+FRAGMENT_HEADER = 'X-Fragment'
+
+
+def is_fragment(request):
+    """Клиент просит фрагмент: ?fragment=1 или заголовок X-Fragment: 1."""
+    return (request.GET.get('fragment') == '1'
+            or request.META.get('HTTP_X_FRAGMENT') == '1')
+
+
+def unread_state(request):
+    """Счётчик непрочитанного виден в шапке каждой страницы."""
+    if not request.user.is_authenticated:
+        return ()
+    return (unread.get_unread(request.user),
+            getattr(request, 'unread_before', 0))
+
+
+def csrf_state(request):
+    """Формы страницы несут CSRF-токен, а вход в систему его меняет.
+
+    get_token заводит токен до расчёта ETag, иначе первый ответ и
+    повторный запрос с новой cookie получили бы разные ETag.
+    """
+    if not request.user.is_authenticated:
+        return ()
+    get_token(request)
+    return (request.META['CSRF_COOKIE'],)
+
+
+def viewer_keys(request):
+    """Отметки «нравится» зрителя видны на любой странице."""
+    if not request.user.is_authenticated:
+        return ()
+    return (f'likes:{request.user.pk}',)
+
+
+def marks_feed_read(view_func):
+    """Сбрасывает счётчик непрочитанного при открытии первой страницы
+    ленты; прежние значения остаются в request для шаблона."""
+    @wraps(view_func)
+    def inner(request, *args, **kwargs):
+        request.unread_before, request.unread_since = 0, None
+        if not request.GET.get('cursor') and not is_fragment(request):
+            request.unread_before, request.unread_since = unread.mark_read(
+                request.user)
+        return view_func(request, *args, **kwargs)
+    return inner
+
+
+def counts_post_views(view_func):
+    """Учитывает просмотр поста, в том числе ответом 304."""
+    @wraps(view_func)
+    def inner(request, post_id, *args, **kwargs):
+        response = view_func(request, post_id, *args, **kwargs)
+        if (request.method == 'GET' and response.status_code in (200, 304)
+                and getattr(request, 'counts_views', True)):
+            view_counts.record(post_id)
+        return response
+    return inner
+
+
+def cache_page_for_guests(timeout, key_prefix=None):
+    """cache_page только для гостей.
+
+    Ключ cache_page не учитывает пользователя, а в теле страницы
+    пользователя есть его отметки «нравится» и счётчик непрочитанного.
+    """
+    def decorator(view_func):
+        cached_view = cache_page(timeout, key_prefix=key_prefix)(view_func)
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+            return cached_view(request, *args, **kwargs)
+        return inner
+    return decorator
+
+
+def cache_by_etag(view_func, etag, timeout):
+    """Кэширует успешные ответы под ключом из ETag и адреса страницы."""
+    @wraps(view_func)
+    def inner(request, *args, **kwargs):
+        key = 'conditional_page:{}:{}'.format(
+            etag(request, *args, **kwargs), request.get_full_path())
+        response = cache.get(key)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.streaming
+                    and not response.cookies):
+                cache.set(key, response, timeout)
+        return response
+    return inner
+
+
+def conditional_page(get_keys, public=True, cache_timeout=None,
+                     get_state=None):
+    """Отвечает 304 Not Modified, если версии данных страницы не менялись.
+
+    get_keys(request, *args, **kwargs) возвращает ключи ContentVersion,
+    от которых зависит страница; проверка стоит один запрос к БД и не
+    требует рендеринга. get_state возвращает кортеж прочих значений,
+    входящих в ETag. С cache_timeout ответ кэшируется под ключом из
+    ETag, поэтому новая версия данных сразу даёт новый ключ.
+    """
+    def page_versions(request, *args, **kwargs):
+        if not hasattr(request, '_page_versions'):
+            keys = ['site', *get_keys(request, *args, **kwargs),
+                    *viewer_keys(request)]
+            request._page_versions = keys, versions.get_versions(keys)
+        return request._page_versions
+
+    def etag(request, *args, **kwargs):
+        keys, found = page_versions(request, *args, **kwargs)
+        state = get_state(request, *args, **kwargs) if get_state else ()
+        return versions.make_etag(
+            keys, found, request.user.pk or 0, datetime.date.today().year,
+            is_fragment(request), *unread_state(request),
+            *csrf_state(request), *state)
+
+    def last_modified(request, *args, **kwargs):
+        # Страница зависит от пользователя, а дата изменения — нет.
+        if request.user.is_authenticated:
+            return None
+        return versions.last_modified(page_versions(request, *args,
+                                                    **kwargs)[1])
+
+    def decorator(view_func):
+        if cache_timeout:
+            view_func = cache_by_etag(view_func, etag, cache_timeout)
+        conditional_view = condition(etag, last_modified)(view_func)
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            if public and not request.user.is_authenticated:
+                patch_cache_control(
+                    response, public=True, max_age=0, must_revalidate=True)
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,192 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import Http404, HttpRequest
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import ContentVersion
+
+from .models import Group, Post
+
+User = get_user_model()
+
+MANIFEST_NAME = 'manifest.json'
+BATCH_SIZE = 100
+
+
+def post_path(post_id):
+    return reverse('posts:post_detail', args=[post_id])
+
+
+def group_path(slug):
+    return reverse('posts:group_slug', args=[slug])
+
+
+def profile_path(username):
+    return reverse('posts:profile', args=[username])
+
+
+def all_paths():
+    for post_id in Post.objects.order_by('id').values_list(
+            'id', flat=True).iterator():
+        yield post_path(post_id)
+    for slug in Group.objects.values_list('slug', flat=True).iterator():
+        yield group_path(slug)
+    for username in User.objects.values_list(
+            'username', flat=True).iterator():
+        yield profile_path(username)
+
+
+def changed_paths(since):
+    """Страницы, чьи ключи версий менялись после since.
+
+    None означает, что изменился ключ site и пересобрать надо всё.
+    """
+    keys = ContentVersion.objects.filter(modified__gt=since).values_list(
+        'key', flat=True)
+    paths = set()
+    for key in keys.iterator():
+        kind, _, value = key.partition(':')
+        if kind == 'site':
+            return None
+        if kind == 'post':
+            paths.add(post_path(int(value)))
+        elif kind == 'group':
+            paths.add(group_path(value))
+        elif kind == 'author':
+            paths.add(profile_path(value))
+    return paths
+
+
+def output_file(path):
+    return os.path.join(path.strip('/'), 'index.html')
+
+
+def write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def render_page(path):
+    """Страница глазами гостя или None, если её больше нет."""
+    match = resolve(path)
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+    request.resolver_match = match
+    request.user = AnonymousUser()
+    # Выгрузка — не просмотр поста.
+    request.counts_views = False
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return None
+    if response.status_code != 200:
+        return None
+    return response
+
+
+def export_batch(directory, paths):
+    """Рендерит страницы и пишет их на диск; возвращает записи манифеста."""
+    entries = {}
+    for path in paths:
+        filename = output_file(path)
+        full_name = os.path.join(directory, filename)
+        response = render_page(path)
+        if response is None:
+            if os.path.exists(full_name):
+                os.remove(full_name)
+            entries[path] = None
+            continue
+        write_atomic(full_name, response.content)
+        entries[path] = {
+            'file': filename,
+            'etag': response.get('ETag'),
+            'content_type': response['Content-Type'],
+        }
+    return entries
+
+
+def batches(paths):
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def export(full=False, workers=1):
+    """Выгружает страницы постов, групп и профилей в EXPORT_DIR.
+
+    Без full рендерятся только страницы, ключи версий которых менялись
+    после прошлой выгрузки. Манифест сопоставляет адрес страницы с файлом,
+    чтобы фронтовый прокси мог отдавать их в обход Django.
+    """
+    directory = settings.EXPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+    started = timezone.now()
+    since = manifest.get('exported_at')
+    paths = None
+    if since and not full:
+        paths = changed_paths(parse_datetime(since))
+    old_pages = manifest.get('pages', {})
+    pages = {} if paths is None else dict(old_pages)
+    if paths is None:
+        paths = all_paths()
+    if workers > 1:
+        # Адреса читаются до fork: соединения не должны наследоваться
+        # дочерними процессами.
+        path_batches = list(batches(paths))
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            results = list(pool.map(partial(export_batch, directory),
+                                    path_batches))
+    else:
+        results = [export_batch(directory, batch) for batch in batches(paths)]
+    exported = 0
+    for entries in results:
+        for path, entry in entries.items():
+            if entry is None:
+                pages.pop(path, None)
+            else:
+                pages[path] = entry
+                exported += 1
+    for path in old_pages.keys() - pages.keys():
+        filename = os.path.join(directory, old_pages[path]['file'])
+        if os.path.exists(filename):
+            os.remove(filename)
+    write_atomic(os.path.join(directory, MANIFEST_NAME), json.dumps({
+        'exported_at': started.isoformat(),
+        'pages': pages,
+    }, ensure_ascii=False, indent=1).encode())
+    return exported
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse, reverse_lazy
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from .models import Group, Post
+
+NUMBER_OF_POSTS_IN_FEED = 20
+FEED_TITLE_LENGTH = 50
+User = get_user_model()
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: последние записи'
+    link = reverse_lazy('posts:index')
+    description = 'Новые записи всех авторов Yatube.'
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj=None):
+        return self.posts(obj).select_related('author', 'group').order_by(
+            '-pub_date')[:NUMBER_OF_POSTS_IN_FEED]
+
+    def item_title(self, item):
+        return Truncator(item.text).chars(FEED_TITLE_LENGTH)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item.pk])
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsFeed(LatestPostsFeed):
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: {obj.title}'
+
+    def link(self, obj):
+        return reverse('posts:group_slug', args=[obj.slug])
+
+    def description(self, obj):
+        return obj.description
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return obj.description
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Yatube: записи {obj.get_full_name() or obj.username}'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=[obj.username])
+
+    def description(self, obj):
+        return f'Новые записи пользователя {obj.username}.'
+
+    def posts(self, obj):
+        return Post.objects.filter(author=obj)
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from .models import Post
+
+# Ограничение SQLite на число параметров запроса.
+CHUNK_SIZE = 500
+
+
+def head_key(feed):
+    return f'feed_head:{feed}'
+
+
+def advance(feeds, post_id):
+    """Сдвигает указатели на новый пост; вызывается при создании поста."""
+    cache.set_many({head_key(feed): post_id for feed in feeds},
+                   settings.FEED_HEAD_TIMEOUT)
+
+
+def invalidate(feeds):
+    cache.delete_many([head_key(feed) for feed in feeds])
+
+
+def get_head(feed, post_list):
+    """id последнего поста ленты: из кэша, иначе по индексу."""
+    key = head_key(feed)
+    head = cache.get(key)
+    if head is None:
+        head = post_list.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        cache.set(key, head, settings.FEED_HEAD_TIMEOUT)
+    return head
+
+
+def load_heads(field, ids):
+    """id последнего поста для каждого значения field из ids."""
+    heads = {}
+    for start in range(0, len(ids), CHUNK_SIZE):
+        rows = Post.objects.filter(
+            **{f'{field}__in': ids[start:start + CHUNK_SIZE]}).values(
+            field).annotate(head=Max('id')).order_by()
+        heads.update((row[field], row['head']) for row in rows)
+    return heads
+
+
+def get_follow_heads(authors, groups):
+    """Указатели лент авторов и групп из подписок — пар (id, имя или
+    slug); промахи читаются запросами по id пачками."""
+    feeds = {f'author:{username}': ('author_id', author_id)
+             for author_id, username in authors}
+    feeds.update({f'group:{slug}': ('group_id', group_id)
+                  for group_id, slug in groups})
+    found = cache.get_many([head_key(feed) for feed in feeds])
+    heads = {feed: found[head_key(feed)] for feed in feeds
+             if head_key(feed) in found}
+    missing = [feed for feed in feeds if feed not in heads]
+    loaded = {}
+    for field in ('author_id', 'group_id'):
+        ids = [feeds[feed][1] for feed in missing if feeds[feed][0] == field]
+        if not ids:
+            continue
+        by_id = load_heads(field, ids)
+        loaded.update((feed, by_id.get(feeds[feed][1], 0))
+                      for feed in missing if feeds[feed][0] == field)
+    if loaded:
+        cache.set_many({head_key(feed): head for feed, head in loaded.items()},
+                       settings.FEED_HEAD_TIMEOUT)
+    heads.update(loaded)
+    return heads
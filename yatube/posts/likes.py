@@ -0,0 +1,98 @@
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from core import versions
+
+from .models import CommentLike, CommentLikeCounter, PostLike, PostLikeCounter
+
+# Вид объекта: модель лайка, модель шардов счётчика и имя поля объекта.
+KINDS = {
+    'post': (PostLike, PostLikeCounter, 'post'),
+    'comment': (CommentLike, CommentLikeCounter, 'comment'),
+}
+
+
+def change_count(kind, object_id, delta):
+    """Прибавляет delta к случайному шарду счётчика объекта."""
+    _, counter, field = KINDS[kind]
+    shard = random.randrange(settings.LIKE_COUNTER_SHARDS)
+    row = counter.objects.filter(**{f'{field}_id': object_id}, shard=shard)
+    if not row.update(count=F('count') + delta):
+        # Шард ещё не создан; при гонке его создаст соседний запрос.
+        counter.objects.bulk_create(
+            [counter(**{f'{field}_id': object_id}, shard=shard)],
+            ignore_conflicts=True)
+        row.update(count=F('count') + delta)
+
+
+def changed_keys(kind, user, obj):
+    """Версии, которые меняет отметка.
+
+    Лайк поста не трогает версию поста: её строка стала бы той же
+    горячей точкой, что и единый счётчик, поэтому итог входит в ETag
+    страницы поста напрямую. Лайки комментариев редки, для них
+    достаточно версии поста.
+    """
+    keys = [f'likes:{user.pk}']
+    if kind == 'comment':
+        keys.append(f'post:{obj.post_id}')
+    return keys
+
+
+def like(kind, user, obj):
+    """Отмечает объект; повторная отметка ничего не меняет."""
+    model, _, field = KINDS[kind]
+    with transaction.atomic():
+        _, created = model.objects.get_or_create(user=user, **{field: obj})
+        if created:
+            change_count(kind, obj.pk, 1)
+    if created:
+        versions.bump(*changed_keys(kind, user, obj))
+    return created
+
+
+def unlike(kind, user, obj):
+    model, _, field = KINDS[kind]
+    with transaction.atomic():
+        deleted, _ = model.objects.filter(user=user, **{field: obj}).delete()
+        if deleted:
+            change_count(kind, obj.pk, -deleted)
+    if deleted:
+        versions.bump(*changed_keys(kind, user, obj))
+    return bool(deleted)
+
+
+def total(kind, object_id):
+    _, counter, field = KINDS[kind]
+    return counter.objects.filter(**{f'{field}_id': object_id}).aggregate(
+        total=Sum('count'))['total'] or 0
+
+
+def annotate(kind, objects, user, totals=True):
+    """Проставляет объектам like_count и has_liked двумя запросами на
+    весь список, сколько бы объектов в нём ни было.
+
+    Без totals like_count не читается: итоги лайков не входят в ETag
+    списков, а отметки зрителя входят через версию likes:{user}.
+    """
+    like, counter, field = KINDS[kind]
+    objects = list(objects)
+    ids = [obj.pk for obj in objects]
+    counts = {}
+    if totals and ids:
+        counts = dict(counter.objects.filter(
+            **{f'{field}_id__in': ids}).values(f'{field}_id').annotate(
+            total=Sum('count')).values_list(f'{field}_id', 'total'))
+    liked = set()
+    if user.is_authenticated and ids:
+        liked = set(like.objects.filter(
+            user=user, **{f'{field}_id__in': ids}).values_list(
+            f'{field}_id', flat=True))
+    for obj in objects:
+        if totals:
+            obj.like_count = counts.get(obj.pk, 0)
+        obj.has_liked = obj.pk in liked
+    return objects
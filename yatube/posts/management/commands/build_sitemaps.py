@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import sitemaps
+
+
+class Command(BaseCommand):
+    help = ('Пишет gzip-шарды карты сайта и индекс в SITEMAP_DIR; '
+            'по умолчанию дописывает только новые посты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересобрать все шарды.')
+        parser.add_argument('--base-url',
+                            help='Адрес сайта вместо SITEMAP_BASE_URL.')
+
+    def handle(self, *args, **options):
+        shards = sitemaps.build(full=options['full'],
+                                base_url=options['base_url'])
+        for shard in shards:
+            self.stdout.write(f'{shard["name"]}: {shard["count"]} URL')
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано шардов: {len(shards)}.'))
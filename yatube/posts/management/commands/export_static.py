@@ -0,0 +1,22 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = ('Выгружает страницы постов, групп и профилей в EXPORT_DIR; '
+            'по умолчанию только изменившиеся с прошлой выгрузки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Выгрузить все страницы.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов рендеринга.')
+
+    def handle(self, *args, **options):
+        exported = export.export(full=options['full'],
+                                 workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено страниц: {exported}.'))
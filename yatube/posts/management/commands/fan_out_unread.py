@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import unread
+
+
+class Command(BaseCommand):
+    help = ('Увеличивает счётчики непрочитанного подписчикам новых постов. '
+            'Запускается по расписанию.')
+
+    def handle(self, *args, **options):
+        handled = unread.fan_out_new()
+        self.stdout.write(self.style.SUCCESS(
+            f'Разослано постов: {handled}.'))
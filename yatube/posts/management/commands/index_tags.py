@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import tagging
+
+
+class Command(BaseCommand):
+    help = 'Заново строит индекс хэштегов и упоминаний для всех постов.'
+
+    def handle(self, *args, **options):
+        indexed = tagging.backfill()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {indexed}.'))
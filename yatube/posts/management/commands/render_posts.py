@@ -0,0 +1,22 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import rerender
+
+
+class Command(BaseCommand):
+    help = ('Перерисовывает HTML постов, отрисованных прежней версией '
+            'рендерера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Перерисовать все посты.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов рендеринга.')
+
+    def handle(self, *args, **options):
+        rendered = rerender.rerender(full=options['full'],
+                                     workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Перерисовано постов: {rendered}.'))
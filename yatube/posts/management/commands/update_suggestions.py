@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает подсказки «на кого подписаться» для '
+            'пользователей, чьи подписки изменились с прошлого запуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать подсказки всех пользователей.')
+
+    def handle(self, *args, **options):
+        updated = suggestions.update(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны подсказки пользователей: {updated}.'))
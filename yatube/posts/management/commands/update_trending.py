@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Добавляет в рейтинг популярных постов комментарии, посты и '
+            'подписки с прошлого запуска. Запускается по расписанию.')
+
+    def handle(self, *args, **options):
+        updated = trending.update()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлён рейтинг постов: {updated}.'))
@@ -0,0 +1,147 @@
+import re
+
+from django.urls import reverse
+from django.utils.html import escape
+
+from .models import TAG_MAX_LENGTH
+
+# Меняется вместе с разметкой, которую выдаёт render: посты со старой
+# версией перерисовывает команда render_posts.
+RENDERER_VERSION = 2
+
+FENCE = '```'
+LIST_ITEM_RE = re.compile(r'^[-*] +(?P<text>.*)$')
+QUOTE_RE = re.compile(r'^> ?(?P<text>.*)$')
+INLINE_RE = re.compile(r'''
+    `(?P<code>[^`\n]+)`
+    | \[(?P<label>[^\]\n]+)\]\((?P<href>https?://[^\s)]+)\)
+    | (?P<url>https?://[^\s<>"]*[^\s<>".,:;!?)'\]])
+    | \*\*(?P<strong>[^*\n]+)\*\*
+    | \*(?P<em>[^*\n]+)\*
+    | (?<![\w@])@(?P<mention>[\w.+-]*\w)
+    | (?<![\w&\#])\#(?P<hashtag>\w{1,%d})(?!\w)
+''' % TAG_MAX_LENGTH, re.VERBOSE)
+
+
+def normalize_tag(tag):
+    return tag.lower()
+
+
+def link(href, label):
+    return (f'<a href="{escape(href)}" rel="nofollow noopener">'
+            f'{label}</a>')
+
+
+def render_match(match):
+    kind = match.lastgroup
+    value = match.group(kind)
+    if kind == 'code':
+        return f'<code>{escape(value)}</code>'
+    if kind == 'href':
+        return link(value, render_inline(match.group('label')))
+    if kind == 'url':
+        return link(value, escape(value))
+    if kind == 'strong':
+        return f'<strong>{render_inline(value)}</strong>'
+    if kind == 'em':
+        return f'<em>{render_inline(value)}</em>'
+    if kind == 'mention':
+        url = reverse('posts:profile', args=[value])
+        return f'<a href="{escape(url)}">@{escape(value)}</a>'
+    url = reverse('posts:tag', args=[normalize_tag(value)])
+    return f'<a class="hashtag" href="{escape(url)}">#{escape(value)}</a>'
+
+
+def render_inline(text):
+    """Экранирует строку и размечает ссылки, код, выделение, упоминания
+    и хэштеги; HTML из текста поста не проходит."""
+    parts = []
+    position = 0
+    for match in INLINE_RE.finditer(text):
+        parts.append(escape(text[position:match.start()]))
+        parts.append(render_match(match))
+        position = match.end()
+    parts.append(escape(text[position:]))
+    return ''.join(parts)
+
+
+def render_lines(lines):
+    return '<br>\n'.join(render_inline(line) for line in lines)
+
+
+def line_kind(line):
+    if line.strip() == FENCE:
+        return 'code'
+    if not line.strip():
+        return None
+    if LIST_ITEM_RE.match(line):
+        return 'list'
+    if QUOTE_RE.match(line):
+        return 'quote'
+    return 'paragraph'
+
+
+def blocks(text):
+    """Делит текст на блоки (вид, строки): абзацы, списки, цитаты и код."""
+    kind, lines = None, []
+    for line in text.replace('\r\n', '\n').split('\n'):
+        if kind == 'code':
+            if line.strip() == FENCE:
+                yield kind, lines
+                kind, lines = None, []
+            else:
+                lines.append(line)
+            continue
+        new_kind = line_kind(line)
+        if new_kind != kind and lines:
+            yield kind, lines
+            lines = []
+        kind = new_kind
+        if kind not in (None, 'code'):
+            lines.append(line)
+    if lines or kind == 'code':
+        yield kind, lines
+
+
+def render_block(kind, lines):
+    if kind == 'code':
+        code = escape('\n'.join(lines))
+        return f'<pre><code>{code}</code></pre>'
+    if kind == 'list':
+        items = ''.join(
+            f'<li>{render_inline(LIST_ITEM_RE.match(line)["text"])}</li>'
+            for line in lines)
+        return f'<ul>{items}</ul>'
+    if kind == 'quote':
+        quoted = [QUOTE_RE.match(line)['text'] for line in lines]
+        return f'<blockquote><p>{render_lines(quoted)}</p></blockquote>'
+    return f'<p>{render_lines(lines)}</p>'
+
+
+def render(text):
+    """Безопасный HTML поста из подмножества Markdown."""
+    return '\n'.join(render_block(kind, lines) for kind, lines in blocks(text))
+
+
+def scan_inline(text, tags, mentions):
+    for match in INLINE_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == 'hashtag':
+            tags.add(normalize_tag(match.group(kind)))
+        elif kind == 'mention':
+            mentions.add(match.group(kind))
+        elif kind in ('strong', 'em'):
+            scan_inline(match.group(kind), tags, mentions)
+        elif kind == 'href':
+            scan_inline(match.group('label'), tags, mentions)
+
+
+def extract(text):
+    """Хэштеги и имена упомянутых пользователей — ровно те, что render
+    превращает в ссылки."""
+    tags, mentions = set(), set()
+    for kind, lines in blocks(text):
+        if kind != 'code':
+            for line in lines:
+                scan_inline(line, tags, mentions)
+    return tags, mentions
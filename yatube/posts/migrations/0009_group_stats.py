@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:04
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    groups = Group.objects.annotate(
+        count=Count('posts'), last=Max('posts__pub_date'))
+    for group in groups.iterator():
+        Group.objects.filter(pk=group.pk).update(
+            posts_count=group.count, last_post_at=group.last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата последнего поста'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число постов'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-last_post_at', '-id'], name='group_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_group_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', '-created', '-id'], name='follow_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-created', '-id'], name='follow_user_created_idx'),
+        ),
+    ]
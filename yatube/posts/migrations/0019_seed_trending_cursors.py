@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import Max
+
+CURSOR_MODELS = (('post', 'Post'), ('comment', 'Comment'),
+                 ('follow', 'Follow'))
+
+
+def seed_cursors(apps, schema_editor):
+    """Курсоры рейтинга начинаются с текущих id: иначе первый запуск
+    прочитает все записи, а старые подписки с датой миграции в created
+    засчитаются как новые."""
+    TrendingCursor = apps.get_model('posts', 'TrendingCursor')
+    for name, model_name in CURSOR_MODELS:
+        model = apps.get_model('posts', model_name)
+        top = model.objects.aggregate(top=Max('id'))['top'] or 0
+        TrendingCursor.objects.get_or_create(
+            name=name, defaults={'last_id': top})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_tags_mentions'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_cursors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:35
+
+import datetime
+from django.db import migrations, models
+from django.utils.timezone import utc
+
+NEVER_POSTED = datetime.datetime(1970, 1, 1, 0, 0, tzinfo=utc)
+
+
+def fill_never_posted(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Group.objects.filter(last_post_at=None).update(last_post_at=NEVER_POSTED)
+
+
+def clear_never_posted(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Group.objects.filter(last_post_at=NEVER_POSTED).update(last_post_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_seed_trending_cursors'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_never_posted, clear_never_posted),
+        migrations.AlterField(
+            model_name='group',
+            name='last_post_at',
+            field=models.DateTimeField(default=datetime.datetime(1970, 1, 1, 0, 0, tzinfo=utc), verbose_name='Дата последнего поста'),
+        ),
+    ]
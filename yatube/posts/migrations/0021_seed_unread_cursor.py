@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import Max
+
+
+def seed_cursor(apps, schema_editor):
+    """Счётчики раньше раздавались при сохранении поста: курсор
+    начинается с текущего id, чтобы старые посты не засчитались снова."""
+    Post = apps.get_model('posts', 'Post')
+    TrendingCursor = apps.get_model('posts', 'TrendingCursor')
+    top = Post.objects.aggregate(top=Max('id'))['top'] or 0
+    TrendingCursor.objects.get_or_create(
+        name='unread', defaults={'last_id': top})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_group_never_posted'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_cursor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:54
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def move_cursor(apps, schema_editor):
+    """Курсор рассылки жил строкой 'unread' в TrendingCursor."""
+    FanOutCursor = apps.get_model('posts', 'FanOutCursor')
+    Post = apps.get_model('posts', 'Post')
+    TrendingCursor = apps.get_model('posts', 'TrendingCursor')
+    old = TrendingCursor.objects.filter(name='unread').first()
+    if old is None:
+        last_id = Post.objects.aggregate(top=Max('id'))['top'] or 0
+    else:
+        last_id = old.last_id
+        old.delete()
+    FanOutCursor.objects.create(pk=1, last_id=last_id)
+
+
+def restore_cursor(apps, schema_editor):
+    FanOutCursor = apps.get_model('posts', 'FanOutCursor')
+    TrendingCursor = apps.get_model('posts', 'TrendingCursor')
+    cursor = FanOutCursor.objects.filter(pk=1).first()
+    if cursor is not None:
+        TrendingCursor.objects.update_or_create(
+            name='unread', defaults={'last_id': cursor.last_id})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_seed_unread_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FanOutCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_id', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(move_cursor, restore_cursor),
+    ]
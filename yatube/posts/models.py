@@ -1,15 +1,35 @@
+from datetime import datetime, timezone
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
 User = get_user_model()
 
 POST_STR_LONG = 15
+# Ответы глубже COMMENT_MAX_DEPTH встают рядом с родителем.
+COMMENT_MAX_DEPTH = 4
+COMMENT_SEGMENT_WIDTH = 10
+TAG_MAX_LENGTH = 100
+# Дата последнего поста группы без постов: с ней группы сортируются
+# простым ORDER BY по group_activity_idx, без эмуляции NULLS LAST.
+NEVER_POSTED = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 class Group(models.Model):
     title = models.CharField('Название группы', max_length=200)
     slug = models.SlugField(unique=True, max_length=150)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    last_post_at = models.DateTimeField(
+        'Дата последнего поста',
+        default=NEVER_POSTED,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_post_at', '-id'],
+                         name='group_activity_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -43,11 +63,25 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    views = models.PositiveIntegerField('Просмотры', default=0)
+    # HTML текста, отрисованный при сохранении, и версия рендерера.
+    text_html = models.TextField('HTML текста', blank=True, editable=False)
+    renderer_version = models.PositiveSmallIntegerField(
+        'Версия рендерера',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:POST_STR_LONG]
@@ -72,6 +106,36 @@ class Comment(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+        verbose_name='Ответ на',
+    )
+    # id предков через разделители фиксированной ширины: ветка комментария
+    # — диапазон строк с общим префиксом в индексе (post, path).
+    path = models.CharField(
+        'Путь в ветке',
+        max_length=COMMENT_SEGMENT_WIDTH * COMMENT_MAX_DEPTH,
+        blank=True,
+        default='',
+        editable=False,
+    )
+    depth = models.PositiveSmallIntegerField(
+        'Уровень вложенности',
+        default=0,
+        editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'depth', '-created', '-id'],
+                         name='comment_post_top_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+        ]
 
     def __str__(self):
         return self.text[:POST_STR_LONG]
@@ -88,3 +152,286 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+    created = models.DateTimeField(
+        'Дата подписки',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-created', '-id'],
+                         name='follow_author_created_idx'),
+            models.Index(fields=['user', '-created', '-id'],
+                         name='follow_user_created_idx'),
+        ]
+
+
+class GroupFollow(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_follows',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='followers',
+    )
+    created = models.DateTimeField(
+        'Дата подписки',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'group'],
+                                    name='unique_group_follow'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.group_id}'
+
+
+class TrendingPost(models.Model):
+    """Рейтинг поста по затухающей со временем активности.
+
+    score хранит логарифм суммы весов событий, умноженных на
+    exp(λ·t): общий множитель затухания одинаков для всех постов,
+    поэтому порядок по score совпадает с порядком по текущему рейтингу.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+    )
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-post'],
+                         name='trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score}'
+
+
+class TrendingCursor(models.Model):
+    """Последний учтённый в рейтинге id записей каждого вида."""
+
+    name = models.CharField(max_length=20, unique=True)
+    last_id = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}={self.last_id}'
+
+
+class FollowSuggestion(models.Model):
+    """Предрассчитанный автор, на которого стоит подписаться."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow_suggestion'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.author_id}: {self.score}'
+
+
+class FeedCursor(models.Model):
+    """Позиция чтения ленты подписок и число непрочитанных постов."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_cursor',
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.unread_count}'
+
+
+class FanOutCursor(models.Model):
+    """Последний пост, по которому разосланы счётчики непрочитанного.
+
+    Единственная строка с первичным ключом PK.
+    """
+
+    PK = 1
+
+    last_id = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.last_id)
+
+
+class PostLike(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='post_likes',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='likes',
+    )
+    created = models.DateTimeField(
+        'Дата лайка',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_post_like'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.post_id}'
+
+
+class CommentLike(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='comment_likes',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='likes',
+    )
+    created = models.DateTimeField(
+        'Дата лайка',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'comment'],
+                                    name='unique_comment_like'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.comment_id}'
+
+
+class PostLikeCounter(models.Model):
+    """Шард счётчика лайков поста: итог — сумма count по шардам.
+
+    Лайк меняет случайный шард, поэтому одновременные лайки популярного
+    поста не ждут блокировки одной строки. Отдельный шард может уйти
+    в минус после снятия лайка, сумма при этом остаётся верной.
+    """
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='like_counters',
+    )
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'shard'],
+                                    name='unique_post_like_shard'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}[{self.shard}]: {self.count}'
+
+
+class CommentLikeCounter(models.Model):
+    """Шард счётчика лайков комментария."""
+
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='like_counters',
+    )
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['comment', 'shard'],
+                                    name='unique_comment_like_shard'),
+        ]
+
+    def __str__(self):
+        return f'{self.comment_id}[{self.shard}]: {self.count}'
+
+
+class PostTag(models.Model):
+    """Хэштег поста. pub_date повторяет дату поста: страница тега
+    читается по индексу (tag, pub_date) без соединения с постами."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tags',
+    )
+    tag = models.CharField('Хэштег', max_length=TAG_MAX_LENGTH)
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'tag'],
+                                    name='unique_post_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-pub_date', '-post'],
+                         name='post_tag_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'#{self.tag} -> {self.post_id}'
+
+
+class PostMention(models.Model):
+    """Упоминание пользователя в посте."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'],
+                                    name='unique_post_mention'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='post_mention_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'@{self.user_id} -> {self.post_id}'
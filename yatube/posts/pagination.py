@@ -0,0 +1,182 @@
+import base64
+import datetime
+import heapq
+import json
+import math
+
+from django.db import connections, models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# Выборок в одном UNION ALL: у SQLite ограничены число параметров
+# запроса и число частей составного SELECT.
+STREAMS_PER_QUERY = 100
+
+# Целые в SQLite — знаковые 64-битные.
+MIN_INTEGER = -2 ** 63
+MAX_INTEGER = 2 ** 63 - 1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _field_value(item, field):
+    if isinstance(item, dict):
+        return item[field]
+    return getattr(item, field)
+
+
+def encode_cursor(values):
+    data = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(
+        json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def _key_field(model, name):
+    field = model._meta.get_field(name)
+    return field.target_field if field.is_relation else field
+
+
+def _cursor_value(field, value):
+    """Значение ключа из курсора, проверенное по типу поля модели."""
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if isinstance(field, models.DateTimeField):
+        if not isinstance(value, str):
+            raise TypeError(value)
+        value = parse_datetime(value)
+        if value is None:
+            raise ValueError(value)
+        return value
+    if isinstance(field, models.FloatField):
+        if not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(value)
+        return float(value)
+    if not isinstance(value, int):
+        raise TypeError(value)
+    if not MIN_INTEGER <= value <= MAX_INTEGER:
+        raise OverflowError(value)
+    return value
+
+
+def decode_cursor(cursor, model, fields):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(data, list) or len(data) != len(fields):
+            raise ValueError(data)
+        return [_cursor_value(_key_field(model, field), value)
+                for field, value in zip(fields, data)]
+    except (ValueError, TypeError, OverflowError):
+        raise InvalidCursor(cursor)
+
+
+class KeysetPage:
+    """Страница выборки, упорядоченной по убыванию полей ключа."""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def after_cursor(queryset, values, fields):
+    """Записи после ключа values при убывающем порядке полей fields."""
+    after = Q()
+    for index, field in enumerate(fields):
+        equal = dict(zip(fields[:index], values))
+        after |= Q(**equal, **{f'{field}__lt': values[index]})
+    # Верхняя граница первого поля позволяет SQLite искать по индексу.
+    return queryset.filter(after, **{f'{fields[0]}__lte': values[0]})
+
+
+def keyset_page(queryset, cursor, per_page, fields=('pub_date', 'id')):
+    """Страница после cursor без OFFSET: фильтр по значениям ключа
+    последней записи предыдущей страницы.
+
+    Поля ключа должны однозначно упорядочивать выборку, последним обычно
+    идёт id.
+    """
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, fields)
+        queryset = after_cursor(queryset, values, fields)
+    items = list(queryset.order_by(*(f'-{field}' for field in fields))[
+        :per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(
+            _field_value(items[-1], field) for field in fields)
+    return KeysetPage(items, next_cursor)
+
+
+def stream_keys(queryset, streams, values, per_page, fields):
+    """Ключи первых per_page + 1 записей каждой выборки одним запросом.
+
+    Каждая выборка — срез по своему индексу с ORDER BY и LIMIT; SQLite
+    не разрешает их в частях UNION ALL, поэтому части обёрнуты в
+    подзапросы.
+    """
+    parts, params = [], []
+    for stream in streams:
+        rows = queryset.filter(stream)
+        if values is not None:
+            rows = after_cursor(rows, values, fields)
+        rows = rows.order_by(*(f'-{field}' for field in fields)).values_list(
+            *fields)[:per_page + 1]
+        sql, sql_params = rows.query.sql_with_params()
+        parts.append(f'SELECT * FROM ({sql})')
+        params.extend(sql_params)
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(' UNION ALL '.join(parts), params)
+        rows = cursor.fetchall()
+    to_python = [queryset.model._meta.get_field(field).to_python
+                 for field in fields]
+    return [tuple(convert(value) for convert, value in zip(to_python, row))
+            for row in rows]
+
+
+def merged_keyset_page(queryset, streams, cursor, per_page,
+                       fields=('pub_date', 'id')):
+    """k-way слияние выборок queryset.filter(stream) с общим ключом.
+
+    Из каждой выборки берутся первые per_page + 1 ключей: в страницу
+    слияния не может попасть запись, которой нет среди них. Выборки
+    читаются запросами UNION ALL по STREAMS_PER_QUERY, ключи сливаются
+    в Python без повторов (запись может входить в несколько выборок),
+    а записи страницы читаются одним запросом по id — последнему полю
+    ключа.
+    """
+    values = decode_cursor(cursor, queryset.model, fields) if cursor else None
+    keys = set()
+    for start in range(0, len(streams), STREAMS_PER_QUERY):
+        keys.update(stream_keys(
+            queryset, streams[start:start + STREAMS_PER_QUERY], values,
+            per_page, fields))
+    # Если какая-то выборка упёрлась в LIMIT, ключей больше per_page;
+    # если нет, в keys все записи после курсора.
+    page_keys = heapq.nlargest(per_page + 1, keys)
+    ids = [key[-1] for key in page_keys[:per_page]]
+    items = list(queryset.filter(pk__in=ids).order_by(
+        *(f'-{field}' for field in fields))) if ids else []
+    next_cursor = None
+    if len(page_keys) > per_page and items:
+        next_cursor = encode_cursor(
+            _field_value(items[-1], field) for field in fields)
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,54 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections, transaction
+
+from core import versions
+
+from . import markup
+from .models import Post
+
+BATCH_SIZE = 200
+
+
+def render_batch(post_ids):
+    """Перерисовывает пачку постов и возвращает их число.
+
+    Сохранение идёт через bulk_update: правка HTML — не правка поста,
+    сигналы и версии отдельных страниц не нужны.
+    """
+    posts = list(Post.objects.filter(id__in=post_ids).only('id', 'text'))
+    for post in posts:
+        post.text_html = markup.render(post.text)
+        post.renderer_version = markup.RENDERER_VERSION
+    with transaction.atomic():
+        Post.objects.bulk_update(posts, ['text_html', 'renderer_version'])
+    return len(posts)
+
+
+def stale_ids(full=False):
+    posts = Post.objects.order_by('id')
+    if not full:
+        posts = posts.exclude(renderer_version=markup.RENDERER_VERSION)
+    return list(posts.values_list('id', flat=True))
+
+
+def rerender(full=False, workers=1):
+    """Перерисовывает посты с устаревшей версией рендерера.
+
+    Рендеринг идёт пачками в workers процессах; после него меняется
+    версия site, чтобы страницы и кэши увидели новый HTML.
+    """
+    post_ids = stale_ids(full)
+    batches = [post_ids[start:start + BATCH_SIZE]
+               for start in range(0, len(post_ids), BATCH_SIZE)]
+    if workers > 1 and len(batches) > 1:
+        # Соединения не должны наследоваться дочерними процессами.
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            rendered = sum(pool.map(render_batch, batches))
+    else:
+        rendered = sum(render_batch(batch) for batch in batches)
+    if rendered:
+        versions.bump('site')
+    return rendered
@@ -0,0 +1,166 @@
+from django.contrib.auth import get_user_model
+from django.db.models import DateTimeField, F, Max, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import versions
+from core.signals import worker_recycling
+
+from . import heads, markup, tagging, threads, view_counts
+from .models import NEVER_POSTED, Comment, Follow, Group, GroupFollow, Post
+
+User = get_user_model()
+
+
+def feed_keys(post):
+    keys = ['index', f'author:{post.author.username}']
+    if post.group_id:
+        keys.append(f'group:{post.group.slug}')
+    return keys
+
+
+def affected_keys(post):
+    return [*feed_keys(post), f'post:{post.pk}']
+
+
+def group_post_added(group_id, pub_date):
+    # Без output_field SQLite запишет дату строкой с '+00:00', в другом
+    # формате, чем ORM, и сравнение строк перепутает порядок групп.
+    pub_date = Value(pub_date, output_field=DateTimeField())
+    Group.objects.filter(pk=group_id).update(
+        posts_count=F('posts_count') + 1,
+        last_post_at=Greatest('last_post_at', pub_date),
+    )
+
+
+def group_post_removed(group_id):
+    last_post_at = Post.objects.filter(group_id=group_id).aggregate(
+        last=Max('pub_date'))['last'] or NEVER_POSTED
+    Group.objects.filter(pk=group_id).update(
+        posts_count=Greatest(F('posts_count') - 1, Value(0)),
+        last_post_at=last_post_at,
+    )
+
+
+def follow_usernames(follow):
+    """Имена подписчика и автора: загруженные объекты берутся из
+    подписки, остальные читаются одним запросом, а не двумя."""
+    names = {}
+    for field in ('user', 'author'):
+        if Follow._meta.get_field(field).is_cached(follow):
+            user = getattr(follow, field)
+            names[user.pk] = user.username
+    missing = {follow.user_id, follow.author_id} - names.keys()
+    if missing:
+        names.update(User.objects.filter(pk__in=missing).values_list(
+            'id', 'username'))
+    return names.get(follow.user_id), names.get(follow.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def render_text(sender, instance, **kwargs):
+    instance.text_html = markup.render(instance.text)
+    instance.renderer_version = markup.RENDERER_VERSION
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_post(sender, instance, **kwargs):
+    instance._old_group_id = instance._old_group_slug = None
+    instance._old_text = None
+    if instance.pk:
+        (instance._old_group_id, instance._old_group_slug,
+         instance._old_text) = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'group__slug', 'text').first()
+            or (None, None, None))
+
+
+def tag_keys(post, created):
+    """Переиндексирует хэштеги и упоминания, если текст изменился."""
+    if created or post.text != getattr(post, '_old_text', None):
+        return tagging.reindex([post])
+    return tagging.indexed_keys([post.pk])
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_slug = getattr(instance, '_old_group_slug', None)
+    versions.bump(*affected_keys(instance), old_slug and f'group:{old_slug}',
+                  *tag_keys(instance, created))
+    group_slug = instance.group.slug if instance.group_id else None
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if instance.group_id != old_group_id:
+        if old_group_id:
+            group_post_removed(old_group_id)
+        if instance.group_id:
+            group_post_added(instance.group_id, instance.pub_date)
+    if created:
+        heads.advance(feed_keys(instance), instance.pk)
+    elif instance.group_id != old_group_id:
+        # Пост сменил группу: указатели обеих групп пересчитаются
+        # по индексу.
+        heads.invalidate([f'group:{slug}' for slug in (group_slug, old_slug)
+                          if slug])
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Строки индекса удаляются каскадом раньше сигнала post_delete.
+    versions.bump(*tagging.indexed_keys([instance.pk]))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    versions.bump(*affected_keys(instance))
+    # Указатель ленты мог стоять на удалённом посте.
+    heads.invalidate(feed_keys(instance))
+    if instance.group_id:
+        group_post_removed(instance.group_id)
+
+
+@receiver(pre_save, sender=Comment)
+def place_comment(sender, instance, **kwargs):
+    if instance._state.adding:
+        threads.place(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    versions.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    user_name, author_name = follow_usernames(instance)
+    versions.bump(f'follows:{instance.user_id}',
+                  author_name and f'followers:{author_name}',
+                  user_name and f'following:{user_name}')
+
+
+@receiver(post_save, sender=GroupFollow)
+@receiver(post_delete, sender=GroupFollow)
+def group_follow_changed(sender, instance, **kwargs):
+    versions.bump(f'follows:{instance.user_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    versions.bump('site', f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход обновляет только last_login, которого нет в профиле.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    versions.bump(f'user:{instance.username}')
+
+
+@receiver(worker_recycling)
+def flush_view_counts(sender, **kwargs):
+    view_counts.counter.flush()
@@ -0,0 +1,178 @@
+import glob
+import gzip
+import json
+import os
+import tempfile
+from itertools import chain, islice
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.urls import reverse
+
+from .models import Group, Post
+
+User = get_user_model()
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+INDEX_NAME = 'sitemap.xml.gz'
+STATE_NAME = 'state.json'
+SHARD_NAME = '{section}-{number:04d}.xml.gz'
+SHARD_NAME_RE = r'[a-z]+-\d{4}\.xml\.gz'
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def absolute_url(base_url, path):
+    return base_url.rstrip('/') + path
+
+
+def w3c_date(value):
+    return value.date().isoformat() if value else None
+
+
+def post_rows(after_id):
+    posts = Post.objects.filter(id__gt=after_id).order_by('id').values_list(
+        'id', 'pub_date')
+    for post_id, pub_date in posts.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield post_id, reverse('posts:post_detail', args=[post_id]), pub_date
+
+
+def group_rows():
+    groups = Group.objects.annotate(
+        lastmod=Max('posts__pub_date')).order_by('id').values_list(
+        'id', 'slug', 'lastmod')
+    for group_id, slug, lastmod in groups.iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE):
+        yield group_id, reverse('posts:group_slug', args=[slug]), lastmod
+
+
+def profile_rows():
+    authors = User.objects.annotate(lastmod=Max('post__pub_date')).filter(
+        lastmod__isnull=False).order_by('id').values_list(
+        'id', 'username', 'lastmod')
+    for user_id, username, lastmod in authors.iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE):
+        yield user_id, reverse('posts:profile', args=[username]), lastmod
+
+
+def write_gzip(path, chunks):
+    """Атомарно записывает поток строк в gzip-файл."""
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as compressed:
+                for chunk in chunks:
+                    compressed.write(chunk.encode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def urlset(entries, base_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<urlset xmlns="{SITEMAP_NS}">\n'
+    for path, lastmod in entries:
+        yield f'<url><loc>{escape(absolute_url(base_url, path))}</loc>'
+        if lastmod:
+            yield f'<lastmod>{w3c_date(lastmod)}</lastmod>'
+        yield '</url>\n'
+    yield '</urlset>\n'
+
+
+def sitemap_index(shards, base_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for shard in shards:
+        path = reverse('posts:sitemap_shard', args=[shard['name']])
+        yield f'<sitemap><loc>{escape(absolute_url(base_url, path))}</loc>'
+        if shard['lastmod']:
+            yield f'<lastmod>{shard["lastmod"]}</lastmod>'
+        yield '</sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def shard_entries(shard, rows):
+    """Отдаёт (путь, дата) и запоминает в shard счётчик и последний id."""
+    for row_id, path, lastmod in rows:
+        shard['count'] += 1
+        shard['last_id'] = row_id
+        date = w3c_date(lastmod)
+        if date and (shard['lastmod'] is None or date > shard['lastmod']):
+            shard['lastmod'] = date
+        yield path, lastmod
+
+
+def write_shards(directory, section, rows, first_number, base_url):
+    """Разбивает поток строк на файлы по SITEMAP_SHARD_SIZE адресов."""
+    size = settings.SITEMAP_SHARD_SIZE
+    rows = iter(rows)
+    shards = []
+    for number, first in enumerate(rows, start=first_number):
+        shard = {
+            'name': SHARD_NAME.format(section=section, number=number),
+            'count': 0,
+            'last_id': None,
+            'lastmod': None,
+        }
+        entries = shard_entries(shard, chain([first], islice(rows, size - 1)))
+        write_gzip(os.path.join(directory, shard['name']),
+                   urlset(entries, base_url))
+        shards.append(shard)
+    return shards
+
+
+def load_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_NAME)) as state:
+            return json.load(state)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(directory, state):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as tmp:
+        json.dump(state, tmp)
+    os.replace(tmp_path, os.path.join(directory, STATE_NAME))
+
+
+def build(full=False, base_url=None):
+    """Пишет шарды и индекс в SITEMAP_DIR, возвращает переписанные шарды.
+
+    Посты идут по возрастанию id, поэтому заполненные шарды не меняются
+    и при инкрементальной сборке переписываются только последний
+    неполный шард и новые. Группы и профили пересобираются целиком:
+    их даты изменения зависят от новых постов. Удалённые посты остаются
+    в заполненных шардах до полной пересборки.
+    """
+    directory = settings.SITEMAP_DIR
+    base_url = base_url or settings.SITEMAP_BASE_URL
+    size = settings.SITEMAP_SHARD_SIZE
+    os.makedirs(directory, exist_ok=True)
+    state = load_state(directory)
+    kept = []
+    if not full and state.get('shard_size') == size and (
+            state.get('base_url') == base_url):
+        kept = [shard for shard in state['posts'] if shard['count'] == size]
+    after_id = kept[-1]['last_id'] if kept else 0
+    written = write_shards(directory, 'posts', post_rows(after_id),
+                           len(kept) + 1, base_url)
+    groups = write_shards(directory, 'groups', group_rows(), 1, base_url)
+    profiles = write_shards(
+        directory, 'profiles', profile_rows(), 1, base_url)
+    shards = kept + written + groups + profiles
+    write_gzip(os.path.join(directory, INDEX_NAME),
+               sitemap_index(shards, base_url))
+    names = {shard['name'] for shard in shards} | {INDEX_NAME}
+    for path in glob.glob(os.path.join(directory, '*.xml.gz')):
+        if os.path.basename(path) not in names:
+            os.remove(path)
+    save_state(directory, {
+        'shard_size': size,
+        'base_url': base_url,
+        'posts': kept + written,
+    })
+    return written + groups + profiles
@@ -0,0 +1,139 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import versions
+from core.models import ContentVersion
+
+from .models import Follow, FollowSuggestion
+
+SUGGESTIONS_PER_USER = 10
+FRIEND_OF_FRIEND_WEIGHT = 1.0
+CO_FOLLOW_WEIGHT = 2.0
+# Для популярных авторов учитывается ограниченное число подписчиков.
+MAX_CO_FOLLOWERS = 500
+RUN_KEY = 'suggestions'
+CHUNK_SIZE = 500
+
+
+def chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def load_graph():
+    """Множества подписок и подписчиков каждого пользователя."""
+    following = defaultdict(set)
+    followers = defaultdict(set)
+    for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'author_id').iterator():
+        following[user_id].add(author_id)
+        followers[author_id].add(user_id)
+    return following, followers
+
+
+def load_edges(ids, edges, field, other):
+    """Дочитывает в edges связи пользователей ids, которых там нет."""
+    missing = set(ids) - edges.keys()
+    for chunk in chunks(missing):
+        for user_id in chunk:
+            edges[user_id] = set()
+        for user_id, other_id in Follow.objects.filter(
+                **{f'{field}__in': chunk}).values_list(field, other):
+            edges[user_id].add(other_id)
+
+
+def load_subgraph(users, following, followers):
+    """Дочитывает часть графа, которую suggest читает для users."""
+    load_edges(users, following, 'user_id', 'author_id')
+    authors = set().union(*(following[user_id] for user_id in users))
+    load_edges(authors, following, 'user_id', 'author_id')
+    load_edges(authors, followers, 'author_id', 'user_id')
+    readers = set().union(*(
+        islice(followers[author], MAX_CO_FOLLOWERS) for author in authors))
+    load_edges(readers, following, 'user_id', 'author_id')
+
+
+def suggest(user_id, following, followers, limit=SUGGESTIONS_PER_USER):
+    """Лучшие кандидаты: друзья друзей и подписки похожих читателей.
+
+    Похожесть читателей — косинусная мера по множествам их подписок.
+    """
+    own = following.get(user_id, set())
+    scores = defaultdict(float)
+    for friend in own:
+        for candidate in following.get(friend, ()):
+            scores[candidate] += FRIEND_OF_FRIEND_WEIGHT
+    overlap = defaultdict(int)
+    for author in own:
+        for index, reader in enumerate(followers.get(author, ())):
+            if index == MAX_CO_FOLLOWERS:
+                break
+            overlap[reader] += 1
+    overlap.pop(user_id, None)
+    for reader, shared in overlap.items():
+        reader_following = following[reader]
+        similarity = shared / math.sqrt(len(own) * len(reader_following))
+        for candidate in reader_following:
+            scores[candidate] += CO_FOLLOW_WEIGHT * similarity
+    candidates = (
+        (score, author) for author, score in scores.items()
+        if author != user_id and author not in own
+    )
+    return heapq.nlargest(limit, candidates)
+
+
+def dirty_users(since):
+    """Пользователи, чьи подписки или подписки их друзей менялись."""
+    keys = ContentVersion.objects.filter(
+        key__startswith='follows:', modified__gt=since).values_list(
+        'key', flat=True)
+    changed = {int(key.partition(':')[2]) for key in keys.iterator()}
+    followers = {}
+    load_edges(changed, followers, 'author_id', 'user_id')
+    return changed.union(*followers.values())
+
+
+def update(full=False):
+    """Пересчитывает подсказки и возвращает число обработанных
+    пользователей.
+
+    Без full пересчитываются только пользователи, затронутые подписками
+    с прошлого запуска. Изменения схожести с другими читателями они
+    получат при следующем своём изменении или при полном пересчёте.
+    """
+    started = timezone.now()
+    last_run = ContentVersion.objects.filter(key=RUN_KEY).values_list(
+        'modified', flat=True).first()
+    full = full or last_run is None
+    if full:
+        following, followers = load_graph()
+        users = set(following) | set(
+            FollowSuggestion.objects.values_list('user_id', flat=True))
+    else:
+        # Граф читается частями, нужными затронутым пользователям.
+        following, followers = {}, {}
+        users = dirty_users(last_run)
+    for chunk in chunks(users):
+        if not full:
+            load_subgraph(chunk, following, followers)
+        suggestions = [
+            FollowSuggestion(user_id=user_id, author_id=author_id,
+                             score=score)
+            for user_id in chunk
+            for score, author_id in suggest(user_id, following, followers)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=chunk).delete()
+            FollowSuggestion.objects.bulk_create(suggestions)
+            versions.bump(*(f'suggestions:{user_id}' for user_id in chunk))
+    # Метка запуска — время начала: подписки, изменённые во время
+    # расчёта, попадут в следующий запуск.
+    versions.bump(RUN_KEY)
+    ContentVersion.objects.filter(key=RUN_KEY).update(modified=started)
+    return len(users)
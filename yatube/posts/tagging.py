@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from core import versions
+
+from . import markup
+from .models import Post, PostMention, PostTag
+
+User = get_user_model()
+
+# Ключей и имён в пачке не должно быть больше лимита параметров SQLite.
+BATCH_SIZE = 100
+
+
+def index_keys(tags, user_ids):
+    return ([f'tag:{tag}' for tag in tags]
+            + [f'mentions:{user_id}' for user_id in user_ids])
+
+
+def indexed_keys(post_ids):
+    """Ключи страниц тегов и упоминаний, на которых видны посты."""
+    tags = PostTag.objects.filter(post_id__in=post_ids).values_list(
+        'tag', flat=True)
+    user_ids = PostMention.objects.filter(post_id__in=post_ids).values_list(
+        'user_id', flat=True)
+    return index_keys(set(tags), set(user_ids))
+
+
+def reindex(posts):
+    """Перестраивает хэштеги и упоминания постов и возвращает ключи
+    страниц, которые были или стали их показывать."""
+    post_ids = [post.pk for post in posts]
+    keys = indexed_keys(post_ids)
+    extracted = {post.pk: markup.extract(post.text) for post in posts}
+    usernames = set().union(*(names for _, names in extracted.values()))
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list(
+        'username', 'id')) if usernames else {}
+    tags = []
+    mentions = []
+    for post in posts:
+        post_tags, names = extracted[post.pk]
+        tags += [PostTag(post_id=post.pk, tag=tag, pub_date=post.pub_date)
+                 for tag in post_tags]
+        mentions += [
+            PostMention(post_id=post.pk, user_id=user_ids[name],
+                        pub_date=post.pub_date)
+            for name in names if name in user_ids
+        ]
+    PostTag.objects.filter(post_id__in=post_ids).delete()
+    PostMention.objects.filter(post_id__in=post_ids).delete()
+    PostTag.objects.bulk_create(tags)
+    PostMention.objects.bulk_create(mentions)
+    return keys + index_keys({row.tag for row in tags},
+                             {row.user_id for row in mentions})
+
+
+def backfill():
+    """Строит индекс для всех постов пачками по id; возвращает их число."""
+    indexed = 0
+    last_id = 0
+    while True:
+        posts = list(Post.objects.filter(id__gt=last_id).order_by(
+            'id').only('id', 'text', 'pub_date')[:BATCH_SIZE])
+        if not posts:
+            return indexed
+        with transaction.atomic():
+            versions.bump(*reindex(posts))
+        indexed += len(posts)
+        last_id = posts[-1].pk
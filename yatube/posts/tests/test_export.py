@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..export import MANIFEST_NAME
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+TEMP_EXPORT_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(EXPORT_DIR=TEMP_EXPORT_DIR)
+class ExportStaticTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_EXPORT_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        shutil.rmtree(TEMP_EXPORT_DIR, ignore_errors=True)
+
+    def export(self, *args):
+        call_command('export_static', '--workers', '1', *args,
+                     stdout=StringIO())
+        with open(os.path.join(TEMP_EXPORT_DIR, MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+
+    def read(self, manifest, url):
+        path = os.path.join(TEMP_EXPORT_DIR, manifest['pages'][url]['file'])
+        with open(path, encoding='utf-8') as page:
+            return page.read()
+
+    def test_full_export(self):
+        """Страницы поста, группы и профиля пишутся на диск и в манифест."""
+        manifest = self.export()
+        urls = [
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:group_slug', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIn(self.post.text, self.read(manifest, url))
+                self.assertTrue(manifest['pages'][url]['etag'])
+
+    def test_incremental_export(self):
+        """Повторная выгрузка трогает только затронутые изменением страницы."""
+        self.export()
+        group_url = reverse('posts:group_slug', args=[self.group.slug])
+        group_file = os.path.join(TEMP_EXPORT_DIR, 'group', self.group.slug,
+                                  'index.html')
+        os.utime(group_file, (0, 0))
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        manifest = self.export()
+        self.assertIn('Комментарий', self.read(
+            manifest, reverse('posts:post_detail', args=[self.post.pk])))
+        self.assertEqual(os.path.getmtime(group_file), 0)
+        self.assertIn(group_url, manifest['pages'])
+
+    def test_deleted_post_removed(self):
+        post = Post.objects.create(author=self.user, text='Удалённый пост')
+        url = reverse('posts:post_detail', args=[post.pk])
+        manifest = self.export()
+        path = os.path.join(TEMP_EXPORT_DIR, manifest['pages'][url]['file'])
+        post.delete()
+        manifest = self.export()
+        self.assertNotIn(url, manifest['pages'])
+        self.assertFalse(os.path.exists(path))
@@ -1,12 +1,15 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from ..forms import PostForm
 from ..models import Comment, Group, Post
 
 User = get_user_model()
@@ -96,6 +99,23 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group, self.group)
 
+    def test_edit_keeps_flushed_views(self):
+        """Правка поста не затирает просмотры, записанные во время неё."""
+        post = Post.objects.create(text='Тестовый текст', author=self.user)
+        is_valid = PostForm.is_valid
+
+        def flush_then_validate(form):
+            Post.objects.filter(pk=post.id).update(views=F('views') + 3)
+            return is_valid(form)
+
+        with mock.patch.object(PostForm, 'is_valid', flush_then_validate):
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.id}),
+                data={'text': '**Новый** текст'})
+        post.refresh_from_db()
+        self.assertEqual(post.views, 3)
+        self.assertEqual(post.text_html, '<p><strong>Новый</strong> текст</p>')
+
 
 class CommentFormTests(TestCase):
     @classmethod
@@ -0,0 +1,99 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from core import versions
+
+from .. import markup
+from ..models import Post
+
+User = get_user_model()
+
+
+class RenderTests(TestCase):
+    def test_html_escaped(self):
+        self.assertEqual(markup.render('<b onclick="x()">жирный</b>'),
+                         '<p>&lt;b onclick=&quot;x()&quot;&gt;'
+                         'жирный&lt;/b&gt;</p>')
+
+    def test_inline_markup(self):
+        html = markup.render('**жирный**, *курсив* и `a<b`')
+        self.assertEqual(html, '<p><strong>жирный</strong>, <em>курсив</em>'
+                               ' и <code>a&lt;b</code></p>')
+
+    def test_links(self):
+        html = markup.render('См. https://example.com/?a=1&b=2. '
+                             'и [тут](https://ya.ru)')
+        self.assertIn('<a href="https://example.com/?a=1&amp;b=2" '
+                      'rel="nofollow noopener">', html)
+        self.assertIn('</a>. и <a href="https://ya.ru" '
+                      'rel="nofollow noopener">тут</a>', html)
+        self.assertNotIn('href="javascript',
+                         markup.render('[x](javascript:alert(1))'))
+
+    def test_mentions_and_hashtags(self):
+        html = markup.render('@IvanFakov про #django, почта a@b.ru')
+        profile_url = reverse('posts:profile', args=['IvanFakov'])
+        self.assertIn(f'<a href="{profile_url}">@IvanFakov</a>', html)
+        tag_url = reverse('posts:tag', args=['django'])
+        self.assertIn(f'<a class="hashtag" href="{tag_url}">#django</a>',
+                      html)
+        self.assertIn('a@b.ru', html)
+
+    def test_extract(self):
+        tags, mentions = markup.extract(
+            '#Django и **#Python** для @IvanFakov, но не `#код`,\n'
+            'не https://example.com/#anchor и не a@b.ru\n```\n#fence\n```')
+        self.assertEqual(tags, {'django', 'python'})
+        self.assertEqual(mentions, {'IvanFakov'})
+
+    def test_blocks(self):
+        html = markup.render('Строка\nвторая\n\n- раз\n- два\n\n> цитата\n'
+                             '```\n<код>\n\n```')
+        self.assertEqual(html, '\n'.join([
+            '<p>Строка<br>\nвторая</p>',
+            '<ul><li>раз</li><li>два</li></ul>',
+            '<blockquote><p>цитата</p></blockquote>',
+            '<pre><code>&lt;код&gt;\n</code></pre>',
+        ]))
+
+
+class StoredHtmlTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='IvanFakov')
+
+    def test_rendered_on_save(self):
+        post = Post.objects.create(author=self.user, text='**Новый** пост')
+        self.assertEqual(post.text_html,
+                         '<p><strong>Новый</strong> пост</p>')
+        self.assertEqual(post.renderer_version, markup.RENDERER_VERSION)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, '<strong>Новый</strong>')
+
+    def test_command_renders_stale_posts(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'*Пост {number}*')
+            for number in range(3))
+        fresh = Post.objects.create(author=self.user, text='Свежий')
+        site = versions.get_versions(['site'])
+        call_command('render_posts', workers=1, stdout=StringIO())
+        self.assertFalse(Post.objects.exclude(
+            renderer_version=markup.RENDERER_VERSION).exists())
+        self.assertEqual(
+            Post.objects.get(text='*Пост 0*').text_html,
+            '<p><em>Пост 0</em></p>')
+        self.assertNotEqual(versions.get_versions(['site']), site)
+        with mock.patch.object(markup, 'RENDERER_VERSION',
+                               markup.RENDERER_VERSION + 1):
+            out = StringIO()
+            call_command('render_posts', workers=1, stdout=out)
+        self.assertIn('4', out.getvalue())
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.renderer_version,
+                         markup.RENDERER_VERSION + 1)
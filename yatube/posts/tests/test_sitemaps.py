@@ -0,0 +1,118 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..sitemaps import INDEX_NAME
+
+User = get_user_model()
+TEMP_SITEMAP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+BASE_URL = 'http://testserver'
+
+
+@override_settings(SITEMAP_DIR=TEMP_SITEMAP_DIR, SITEMAP_SHARD_SIZE=2,
+                   SITEMAP_BASE_URL=BASE_URL)
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}',
+                                group=cls.group)
+            for number in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_SITEMAP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        shutil.rmtree(TEMP_SITEMAP_DIR, ignore_errors=True)
+
+    def read(self, name):
+        with gzip.open(os.path.join(TEMP_SITEMAP_DIR, name), 'rt') as sitemap:
+            return sitemap.read()
+
+    def build(self, *args):
+        call_command('build_sitemaps', *args, stdout=StringIO())
+
+    def test_shards_and_index(self):
+        """Посты делятся на шарды, индекс ссылается на каждый шард."""
+        self.build()
+        first = self.read('posts-0001.xml.gz')
+        second = self.read('posts-0002.xml.gz')
+        for post in self.posts[:2]:
+            self.assertIn(BASE_URL + reverse(
+                'posts:post_detail', args=[post.pk]), first)
+        self.assertIn(BASE_URL + reverse(
+            'posts:post_detail', args=[self.posts[2].pk]), second)
+        self.assertIn(BASE_URL + reverse(
+            'posts:group_slug', args=[self.group.slug]),
+            self.read('groups-0001.xml.gz'))
+        self.assertIn(BASE_URL + reverse(
+            'posts:profile', args=[self.user.username]),
+            self.read('profiles-0001.xml.gz'))
+        index = self.read(INDEX_NAME)
+        for name in ('posts-0001', 'posts-0002', 'groups-0001',
+                     'profiles-0001'):
+            self.assertIn(f'/sitemaps/{name}.xml.gz</loc>', index)
+
+    def test_incremental_build_keeps_full_shards(self):
+        """Новый пост переписывает только неполный шард."""
+        self.build()
+        full_shard = os.path.join(TEMP_SITEMAP_DIR, 'posts-0001.xml.gz')
+        os.utime(full_shard, (0, 0))
+        new_post = Post.objects.create(author=self.user, text='Новый пост')
+        self.build()
+        self.assertEqual(os.path.getmtime(full_shard), 0)
+        self.assertIn(reverse('posts:post_detail', args=[new_post.pk]),
+                      self.read('posts-0002.xml.gz'))
+        self.build('--full')
+        self.assertNotEqual(os.path.getmtime(full_shard), 0)
+
+    def test_sitemap_views(self):
+        response = self.client.get(reverse('posts:sitemap_index'))
+        self.assertEqual(response.status_code, 404)
+        self.build()
+        response = self.client.get(reverse('posts:sitemap_index'))
+        self.assertIn(b'<sitemapindex', b''.join(response.streaming_content))
+        response = self.client.get(reverse('posts:sitemap_index'),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get(
+            reverse('posts:sitemap_shard', args=['posts-0001.xml.gz']))
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn(b'<urlset', gzip.decompress(
+            b''.join(response.streaming_content)))
+
+    def test_index_file_closed(self):
+        """Распакованный индекс не оставляет открытым файл на диске."""
+        self.build()
+        opened = []
+        real_open = open
+
+        def tracking_open(*args, **kwargs):
+            opened.append(real_open(*args, **kwargs))
+            return opened[-1]
+
+        with mock.patch('builtins.open', side_effect=tracking_open):
+            response = self.client.get(reverse('posts:sitemap_index'))
+            b''.join(response.streaming_content)
+        self.assertTrue(opened)
+        self.assertTrue(all(sitemap.closed for sitemap in opened))
@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import suggestions
+from ..models import Follow, FollowSuggestion
+
+User = get_user_model()
+
+
+class FollowSuggestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.friend, cls.friend_pick, cls.twin, cls.twin_pick = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'friend_pick', 'twin',
+                         'twin_pick'))
+        cls.loner = User.objects.create_user(username='loner')
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.friend_pick)
+        Follow.objects.create(user=cls.twin, author=cls.friend)
+        Follow.objects.create(user=cls.twin, author=cls.twin_pick)
+        Follow.objects.create(user=cls.loner, author=cls.twin)
+
+    def setUp(self):
+        cache.clear()
+
+    def suggested(self, user):
+        return list(FollowSuggestion.objects.filter(user=user).order_by(
+            '-score').values_list('author__username', flat=True))
+
+    def test_friends_of_friends_and_co_follows(self):
+        """Подсказки из подписок друзей и похожих читателей."""
+        suggestions.update()
+        suggested = self.suggested(self.reader)
+        self.assertIn('friend_pick', suggested)
+        self.assertIn('twin_pick', suggested)
+        self.assertNotIn('friend', suggested)
+        self.assertNotIn('reader', suggested)
+
+    def test_incremental_update(self):
+        """Пересчитываются только затронутые подпиской пользователи."""
+        self.assertEqual(suggestions.update(), 4)
+        self.assertEqual(suggestions.update(), 0)
+        Follow.objects.create(user=self.twin_pick, author=self.loner)
+        # Сам подписавшийся и его подписчик twin; весь граф не читается.
+        with mock.patch.object(suggestions, 'load_graph') as load_graph:
+            self.assertEqual(suggestions.update(), 2)
+        load_graph.assert_not_called()
+        self.assertIn('loner', self.suggested(self.twin))
+        self.assertEqual(self.suggested(self.twin_pick), ['twin'])
+
+    def test_follow_index_shows_suggestions(self):
+        suggestions.update()
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [item.author.username for item in response.context['suggestions']],
+            self.suggested(self.reader))
+        self.assertContains(response, 'twin_pick')
+
+    def test_followed_authors_hidden_before_update(self):
+        """Автор, на которого подписались после расчёта, не подсказывается."""
+        suggestions.update()
+        Follow.objects.create(user=self.reader, author=self.twin_pick)
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertNotIn(
+            'twin_pick',
+            [item.author.username for item in response.context['suggestions']])
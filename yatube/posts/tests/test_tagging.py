@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, PostMention, PostTag
+from ..views import NUMBER_OF_POSTS_ON_PAGE
+
+User = get_user_model()
+
+
+class TagIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='IvanFakov')
+        cls.reader = User.objects.create_user(username='VasyaPupkin')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_indexed_on_save(self):
+        post = Post.objects.create(
+            author=self.author, text='#Django для @VasyaPupkin и @nobody')
+        self.assertEqual(
+            list(PostTag.objects.values_list('tag', 'pub_date')),
+            [('django', post.pub_date)])
+        self.assertEqual(
+            list(PostMention.objects.values_list('post', 'user')),
+            [(post.id, self.reader.id)])
+        post.text = 'Теперь про #python'
+        post.save()
+        self.assertEqual(list(PostTag.objects.values_list('tag', flat=True)),
+                         ['python'])
+        self.assertFalse(PostMention.objects.exists())
+
+    def test_tag_page_keyset(self):
+        posts = [Post.objects.create(author=self.author, text=f'#Тег {number}')
+                 for number in range(NUMBER_OF_POSTS_ON_PAGE + 1)]
+        Post.objects.create(author=self.author, text='Без тегов')
+        url = reverse('posts:tag', kwargs={'name': 'ТЕГ'})
+        page = self.client.get(url).context['page']
+        self.assertEqual([entry.post for entry in page], posts[:0:-1])
+        rest = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual([entry.post for entry in rest.context['page']],
+                         [posts[0]])
+
+    def test_tag_page_updates_on_edit(self):
+        post = Post.objects.create(author=self.author, text='#django')
+        url = reverse('posts:tag', kwargs={'name': 'django'})
+        etag = self.client.get(url)['ETag']
+        post.text = '#django, новая версия'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        post.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(list(response.context['page']), [])
+
+    def test_mentions_page(self):
+        post = Post.objects.create(author=self.author,
+                                   text='Привет, @VasyaPupkin!')
+        Post.objects.create(author=self.author, text='Привет, @IvanFakov!')
+        response = self.reader_client.get(reverse('posts:mentions'))
+        self.assertEqual([entry.post for entry in response.context['page']],
+                         [post])
+        self.assertEqual(
+            self.client.get(reverse('posts:mentions')).status_code, 302)
+
+    def test_backfill_command(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text='#один @VasyaPupkin'),
+            Post(author=self.author, text='#два'),
+        ])
+        self.assertFalse(PostTag.objects.exists())
+        call_command('index_tags', stdout=StringIO())
+        self.assertEqual(
+            set(PostTag.objects.values_list('tag', flat=True)),
+            {'один', 'два'})
+        self.assertEqual(PostMention.objects.get().user, self.reader)
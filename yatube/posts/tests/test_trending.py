@@ -0,0 +1,108 @@
+import datetime
+import importlib
+import math
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import trending
+from ..models import Comment, Follow, Post, TrendingCursor, TrendingPost
+from ..views import NUMBER_OF_POSTS_ON_PAGE
+
+User = get_user_model()
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='IvanFakov')
+        cls.reader = User.objects.create_user(username='VasyaPupkin')
+        cls.quiet_post = Post.objects.create(author=cls.author,
+                                             text='Тихий пост')
+        cls.hot_post = Post.objects.create(author=cls.reader,
+                                           text='Обсуждаемый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def scores(self):
+        return dict(TrendingPost.objects.values_list('post_id', 'score'))
+
+    def test_log_add(self):
+        self.assertAlmostEqual(
+            trending.log_add(math.log(2), math.log(3)), math.log(5))
+        self.assertEqual(trending.log_add(None, 1.5), 1.5)
+
+    def test_comments_raise_rank(self):
+        """Комментарии поднимают пост выше поста без активности."""
+        Comment.objects.create(post=self.quiet_post, author=self.reader,
+                               text='Первый')
+        trending.update()
+        scores = self.scores()
+        self.assertGreater(scores[self.quiet_post.pk],
+                           scores[self.hot_post.pk])
+        for number in range(3):
+            Comment.objects.create(post=self.hot_post, author=self.author,
+                                   text=f'Комментарий {number}')
+        trending.update()
+        new_scores = self.scores()
+        self.assertEqual(new_scores[self.quiet_post.pk],
+                         scores[self.quiet_post.pk])
+        self.assertGreater(new_scores[self.hot_post.pk],
+                           new_scores[self.quiet_post.pk])
+
+    def test_update_is_incremental(self):
+        """Повторный запуск без новых событий не меняет рейтинг."""
+        trending.update()
+        scores = self.scores()
+        self.assertEqual(trending.update(), 0)
+        self.assertEqual(self.scores(), scores)
+
+    def test_follow_credits_latest_post(self):
+        trending.update()
+        scores = self.scores()
+        Follow.objects.create(user=self.reader, author=self.author)
+        trending.update()
+        self.assertGreater(self.scores()[self.quiet_post.pk],
+                           scores[self.quiet_post.pk])
+
+    def test_seeded_cursors_skip_history(self):
+        """После миграции первый запуск не читает прежние события."""
+        Comment.objects.create(post=self.quiet_post, author=self.reader,
+                               text='Старый')
+        Follow.objects.create(user=self.reader, author=self.author)
+        TrendingCursor.objects.all().delete()
+        migration = importlib.import_module(
+            'posts.migrations.0019_seed_trending_cursors')
+        migration.seed_cursors(apps, None)
+        self.assertEqual(trending.update(), 0)
+        Comment.objects.create(post=self.hot_post, author=self.author,
+                               text='Новый')
+        trending.update()
+        self.assertEqual(list(self.scores()), [self.hot_post.pk])
+
+    def test_old_posts_leave_ranking(self):
+        trending.update()
+        trending.update(now=timezone.now() + datetime.timedelta(days=30))
+        self.assertFalse(TrendingPost.objects.exists())
+
+    def test_trending_page(self):
+        """Страница популярного листается курсором в порядке рейтинга."""
+        for number in range(NUMBER_OF_POSTS_ON_PAGE):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        trending.update()
+        response = self.client.get(reverse('posts:trending'))
+        page = response.context['page']
+        self.assertEqual(len(page), NUMBER_OF_POSTS_ON_PAGE)
+        ranked = [entry.post_id for entry in TrendingPost.objects.order_by(
+            '-score', '-post_id')]
+        self.assertEqual([entry.post_id for entry in page],
+                         ranked[:NUMBER_OF_POSTS_ON_PAGE])
+        response = self.client.get(reverse('posts:trending'),
+                                   {'cursor': page.next_cursor})
+        self.assertEqual([entry.post_id for entry in response.context['page']],
+                         ranked[NUMBER_OF_POSTS_ON_PAGE:])
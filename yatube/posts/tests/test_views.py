@@ -1,16 +1,27 @@
 import shutil
 import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
-from ..views import NUMBER_OF_POSTS_ON_PAGE
+from .. import likes, pagination, unread, view_counts
+from ..models import (COMMENT_MAX_DEPTH, NEVER_POSTED, Comment, CommentLike,
+                      FeedCursor, Follow, Group, GroupFollow, Post, PostLike,
+                      PostLikeCounter)
+from ..views import (NUMBER_OF_COMMENTS_ON_PAGE, NUMBER_OF_POSTS_ON_PAGE,
+                     NUMBER_OF_USERS_ON_PAGE)
 
 User = get_user_model()
 
@@ -322,3 +333,957 @@ class FollowTests(TestCase):
         self.assertContains(
             self.authorized_client.get(reverse('posts:follow_index')),
             post.text)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(username='IvanFakov')
+        cls.follower_user = User.objects.create_user(username='VasyaPupkin')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author_user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        Follow.objects.create(user=cls.follower_user, author=cls.author_user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower_user)
+        cache.clear()
+
+    def assertNotModified(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменившиеся страницы отвечают 304."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_slug', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author_user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotModified(self.client, url)
+                self.assertNotModified(self.authorized_client, url)
+
+    def test_new_post_changes_etag(self):
+        """Новый пост в группе меняет ETag ленты группы."""
+        url = reverse('posts:group_slug', kwargs={'slug': self.group.slug})
+        etag = self.assertNotModified(self.client, url)
+        Post.objects.create(author=self.author_user, text='Новый пост',
+                            group=self.group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_detail_etag(self):
+        """Комментарий меняет ETag страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.assertNotModified(self.client, url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_index_tracks_followed_authors(self):
+        """ETag ленты подписок зависит от постов избранных авторов."""
+        url = reverse('posts:follow_index')
+        etag = self.assertNotModified(self.authorized_client, url)
+        Post.objects.create(author=self.author_user, text='Новый пост')
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_csrf_token_changes_etag(self):
+        """После нового входа страница с формой приходит с новым
+        CSRF-токеном, а не из 304."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.assertNotModified(self.authorized_client, url)
+        # Вход меняет CSRF-cookie (rotate_token).
+        self.authorized_client.cookies[settings.CSRF_COOKIE_NAME] = (
+            'a' * 64)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_control(self):
+        """Гостю — public с ревалидацией, пользователю — private."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.authorized_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+        )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(NUMBER_OF_COMMENTS_ON_PAGE + 5)
+        )
+
+    def test_first_page_rendered_with_post(self):
+        """Страница поста показывает первую страницу новых комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), NUMBER_OF_COMMENTS_ON_PAGE)
+        self.assertTrue(comments.has_next)
+        self.assertContains(response, comments.next_cursor)
+
+    def test_load_more_fragment(self):
+        """Фрагмент по курсору отдаёт оставшиеся комментарии без
+        повторов и без base.html."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        first = self.client.get(url).context['comments']
+        response = self.client.get(url, {'cursor': first.next_cursor})
+        self.assertTemplateNotUsed(response, 'base.html')
+        second = response.context['comments']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next)
+        ids = [comment.id for comment in [*first, *second]]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(set(ids)), NUMBER_OF_COMMENTS_ON_PAGE + 5)
+
+    def test_invalid_cursor(self):
+        """Неверный курсор даёт 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CraftedCursorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост #тег')
+
+    def test_cursor_values_checked_against_key_fields(self):
+        """Курсор, не подходящий по типам к полям ключа, даёт 404,
+        а не ошибку сервера."""
+        date = '2020-01-01T00:00:00+00:00'
+        cursors = [
+            ['2020-13-45T00:00:00', 1],
+            [True, 1],
+            [123, 1],
+            [date, True],
+            [date, 2 ** 70],
+            [date, 1.5],
+        ]
+        urls = [
+            (reverse('posts:index'), {'fragment': 1}),
+            (reverse('posts:group_slug', kwargs={'slug': self.group.slug}),
+             {'fragment': 1}),
+            (reverse('posts:tag', kwargs={'name': 'тег'}), {}),
+            (reverse('posts:post_comments',
+                     kwargs={'post_id': self.post.id}), {}),
+        ]
+        for url, params in urls:
+            for values in cursors:
+                with self.subTest(url=url, values=values):
+                    response = self.client.get(url, {
+                        **params, 'cursor': pagination.encode_cursor(values)})
+                    self.assertEqual(response.status_code, 404)
+
+    def test_trending_score_must_be_number(self):
+        """Ключ популярного — число: дата или bool вместо score дают 404."""
+        for values in (['2020-01-01T00:00:00', 1], [True, 1], [1.5, 2 ** 70],
+                       ['1e400', 1]):
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse('posts:trending'),
+                    {'cursor': pagination.encode_cursor(values)})
+                self.assertEqual(response.status_code, 404)
+
+    def test_valid_cursor_accepted(self):
+        """Курсор правильных типов принимается."""
+        cursor = pagination.encode_cursor(
+            ['2100-01-01T00:00:00+00:00', 2 ** 63 - 1])
+        response = self.client.get(reverse('posts:index'),
+                                   {'fragment': 1, 'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page']), [self.post])
+
+
+class PostFragmentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.follower_user = User.objects.create_user(username='VasyaPupkin')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}', group=cls.group)
+            for i in range(NUMBER_OF_TEST_POSTS)
+        )
+        Follow.objects.create(user=cls.follower_user, author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower_user)
+        cache.clear()
+
+    def test_fragment_pages_through_posts(self):
+        """Фрагменты отдают список постов порциями по курсору."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_slug', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url, {'fragment': 1})
+                self.assertTemplateUsed(response, 'includes/post_list.html')
+                self.assertTemplateNotUsed(response, 'base.html')
+                first = response.context['page']
+                self.assertEqual(len(first), NUMBER_OF_POSTS_ON_PAGE)
+                response = self.authorized_client.get(
+                    url, {'fragment': 1, 'cursor': response['X-Next-Cursor']})
+                second = response.context['page']
+                rest = NUMBER_OF_TEST_POSTS - NUMBER_OF_POSTS_ON_PAGE
+                self.assertEqual(len(second), rest)
+                self.assertFalse(response.has_header('X-Next-Cursor'))
+                ids = {post.id for post in [*first, *second]}
+                self.assertEqual(len(ids), NUMBER_OF_TEST_POSTS)
+
+    def test_fragment_header(self):
+        """Фрагмент можно запросить заголовком X-Fragment."""
+        url = reverse('posts:group_slug', kwargs={'slug': self.group.slug})
+        full = self.client.get(url)
+        fragment = self.client.get(url, HTTP_X_FRAGMENT='1')
+        self.assertTemplateNotUsed(fragment, 'base.html')
+        self.assertIn('X-Fragment', fragment['Vary'])
+        self.assertNotEqual(full['ETag'], fragment['ETag'])
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def feed_urls(self):
+        urls = {
+            reverse('posts:feed_rss'): 'application/rss+xml',
+            reverse('posts:feed_atom'): 'application/atom+xml',
+            reverse('posts:group_feed_rss',
+                    kwargs={'slug': self.group.slug}): 'application/rss+xml',
+            reverse('posts:group_feed_atom',
+                    kwargs={'slug': self.group.slug}): 'application/atom+xml',
+        }
+        for feed_type in ('rss', 'atom'):
+            url = reverse(f'posts:profile_feed_{feed_type}',
+                          kwargs={'username': self.user.username})
+            urls[url] = f'application/{feed_type}+xml'
+        return urls
+
+    def test_feeds_contain_posts(self):
+        """Ленты RSS и Atom содержат пост и отвечают 304 без изменений."""
+        for url, content_type in self.feed_urls().items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type))
+                self.assertContains(response, self.post.text)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_unknown_group_feed_not_found(self):
+        response = self.client.get(
+            reverse('posts:group_feed_rss', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_repeated_poll_served_from_cache(self):
+        """Повторный запрос ленты стоит одного запроса версий."""
+        url = reverse('posts:feed_rss')
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    def test_new_post_invalidates_cached_feed(self):
+        url = reverse('posts:group_feed_atom',
+                      kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        Post.objects.create(author=self.user, text='Свежий пост',
+                            group=self.group)
+        response = self.client.get(url)
+        self.assertContains(response, 'Свежий пост')
+
+
+class GroupDirectoryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовый текст',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertStats(self, group, posts_count, last_post_at):
+        group.refresh_from_db()
+        self.assertEqual(group.posts_count, posts_count)
+        self.assertEqual(group.last_post_at, last_post_at)
+
+    def test_stats_follow_posts(self):
+        """Счётчик и дата последнего поста следуют за постами группы."""
+        first = Post.objects.create(author=self.user, text='Первый',
+                                    group=self.group)
+        second = Post.objects.create(author=self.user, text='Второй',
+                                     group=self.group)
+        self.assertStats(self.group, 2, second.pub_date)
+        second.group = self.other_group
+        second.save()
+        self.assertStats(self.group, 1, first.pub_date)
+        self.assertStats(self.other_group, 1, second.pub_date)
+        first.delete()
+        self.assertStats(self.group, 0, NEVER_POSTED)
+
+    def test_last_post_at_stored_like_orm(self):
+        """Дата из UPDATE хранится в том же формате, что пишет ORM."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        table = Group._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT CAST(last_post_at AS TEXT) FROM {table} '
+                           'WHERE id = %s', [self.group.pk])
+            stored = cursor.fetchone()[0]
+        field = Group._meta.get_field('last_post_at')
+        self.assertEqual(
+            stored, field.get_db_prep_value(post.pub_date, connection))
+
+    def test_directory_sorted_by_activity(self):
+        Post.objects.create(author=self.user, text='Пост',
+                            group=self.other_group)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:groups'))
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.other_group, self.group])
+        self.assertContains(response, 'Записей: 1')
+        self.assertContains(response, 'последняя', count=1)
+        # Порядок без эмуляции NULLS LAST, чтобы работал group_activity_idx.
+        self.assertNotIn('IS NULL', queries[-1]['sql'])
+
+
+class FollowListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(username='IvanFakov')
+        cls.viewer = User.objects.create_user(username='VasyaPupkin')
+        User.objects.bulk_create(
+            User(username=f'follower{number}')
+            for number in range(NUMBER_OF_USERS_ON_PAGE + 1))
+        cls.followers = list(User.objects.filter(
+            username__startswith='follower').order_by('id'))
+        for follower in cls.followers:
+            Follow.objects.create(user=follower, author=cls.author_user)
+        Follow.objects.create(user=cls.viewer, author=cls.followers[-1])
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.viewer)
+
+    def test_followers_keyset_pages(self):
+        """Подписчики листаются курсором, новые подписчики первыми."""
+        url = reverse('posts:followers',
+                      kwargs={'username': self.author_user.username})
+        response = self.client.get(url)
+        page = response.context['page']
+        self.assertEqual(len(page), NUMBER_OF_USERS_ON_PAGE)
+        self.assertEqual(response.context['users'][0][0],
+                         self.followers[-1])
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual([user for user, _ in response.context['users']],
+                         [self.followers[0]])
+
+    def test_follow_state_in_one_query(self):
+        """Состояние подписки зрителя не зависит от числа строк."""
+        url = reverse('posts:followers',
+                      kwargs={'username': self.author_user.username})
+        # Сессия, пользователь, счётчик непрочитанного, версии, автор,
+        # страница, подписки зрителя.
+        with self.assertNumQueries(7):
+            response = self.authorized_client.get(url)
+        states = dict(response.context['users'])
+        self.assertTrue(states[self.followers[-1]])
+        self.assertFalse(states[self.followers[-2]])
+
+    def test_following_list(self):
+        url = reverse('posts:following',
+                      kwargs={'username': self.viewer.username})
+        response = self.client.get(url)
+        self.assertEqual(response.context['users'],
+                         [(self.followers[-1], False)])
+
+    def test_unfollow_reads_usernames_once(self):
+        """Удаление подписки читает оба имени одним запросом."""
+        url = reverse('posts:followers',
+                      kwargs={'username': self.followers[-1].username})
+        etag = self.client.get(url)['ETag']
+        follow = Follow.objects.get(user=self.viewer)
+        with CaptureQueriesContext(connection) as queries:
+            follow.delete()
+        self.assertEqual(len([query for query in queries
+                              if 'FROM "auth_user"' in query['sql']]), 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_follow_changes_etag(self):
+        url = reverse('posts:following',
+                      kwargs={'username': self.viewer.username})
+        etag = self.client.get(url)['ETag']
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author_user.username}))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class GroupFollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='VasyaPupkin')
+        cls.author_user = User.objects.create_user(username='IvanFakov')
+        cls.stranger = User.objects.create_user(username='PetyaPetrov')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author_user)
+        GroupFollow.objects.create(user=cls.reader, group=cls.group)
+        cls.posts = []
+        for number in range(NUMBER_OF_POSTS_ON_PAGE):
+            cls.posts.append(Post.objects.create(
+                author=cls.author_user, text=f'Пост автора {number}'))
+            cls.posts.append(Post.objects.create(
+                author=cls.stranger, text=f'Пост группы {number}',
+                group=cls.group))
+        # Пост подписанного автора в подписанной группе.
+        cls.posts.append(Post.objects.create(
+            author=cls.author_user, text='Общий пост', group=cls.group))
+        Post.objects.create(author=cls.stranger, text='Чужой пост')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_group_follow_and_unfollow(self):
+        other = Group.objects.create(title='Другая', slug='other-slug',
+                                     description='Текст')
+        self.authorized_client.get(
+            reverse('posts:group_follow', kwargs={'slug': other.slug}))
+        self.assertTrue(GroupFollow.objects.filter(
+            user=self.reader, group=other).exists())
+        response = self.authorized_client.get(
+            reverse('posts:group_slug', kwargs={'slug': other.slug}))
+        self.assertTrue(response.context['following'])
+        self.authorized_client.get(
+            reverse('posts:group_unfollow', kwargs={'slug': other.slug}))
+        self.assertFalse(GroupFollow.objects.filter(
+            user=self.reader, group=other).exists())
+
+    def test_feed_merges_authors_and_groups(self):
+        """Лента подписок сливает авторов и группы без дублей."""
+        url = reverse('posts:follow_index')
+        expected = sorted(self.posts, key=lambda post: (post.pub_date,
+                                                        post.id),
+                          reverse=True)
+        response = self.authorized_client.get(url)
+        first = list(response.context['page_obj'])
+        self.assertEqual(first, expected[:NUMBER_OF_POSTS_ON_PAGE])
+        seen = first
+        cursor = response.context['next_cursor']
+        while cursor:
+            response = self.authorized_client.get(
+                url, {'fragment': 1, 'cursor': cursor})
+            seen += list(response.context['page'])
+            cursor = response.get('X-Next-Cursor')
+        self.assertEqual(seen, expected)
+
+    def test_feed_streams_in_one_statement(self):
+        """Ленты всех подписок читаются одним UNION ALL по индексам без
+        сортировки, записи страницы — ещё одним запросом."""
+        for number in range(3):
+            author = User.objects.create_user(username=f'Author{number}')
+            Follow.objects.create(user=self.reader, author=author)
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('posts:follow_index'))
+        unions = [query['sql'] for query in queries
+                  if 'UNION ALL' in query['sql']]
+        self.assertEqual(len(unions), 1)
+        self.assertEqual(unions[0].count('UNION ALL'), 4)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {unions[0]}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING COVERING INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        posts = [query['sql'] for query in queries
+                 if query['sql'].startswith('SELECT "posts_post"')]
+        self.assertEqual(len(posts), 1)
+
+    def test_streams_split_across_statements(self):
+        """Подписок больше STREAMS_PER_QUERY — несколько запросов, та же
+        страница."""
+        url = reverse('posts:follow_index')
+        expected = list(self.authorized_client.get(url).context['page_obj'])
+        cache.clear()
+        with mock.patch.object(pagination, 'STREAMS_PER_QUERY', 1):
+            response = self.authorized_client.get(url)
+        self.assertEqual(list(response.context['page_obj']), expected)
+
+    def test_merged_page_cached_per_user(self):
+        url = reverse('posts:follow_index')
+        # Первый просмотр сбрасывает счётчик непрочитанного.
+        self.authorized_client.get(url)
+        first = self.authorized_client.get(url)
+        # Сессия, пользователь, подписки на авторов и группы, счётчик
+        # непрочитанного, версии.
+        with self.assertNumQueries(6):
+            second = self.authorized_client.get(url)
+        self.assertEqual(first.content, second.content)
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='VasyaPupkin')
+        cls.author_user = User.objects.create_user(username='IvanFakov')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author_user)
+        GroupFollow.objects.create(user=cls.reader, group=cls.group)
+        GroupFollow.objects.create(user=cls.author_user, group=cls.group)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_new_posts_counted_once_per_reader(self):
+        """Пост подписанного автора в подписанной группе — один
+        непрочитанный, сам автор его не получает."""
+        Post.objects.create(author=self.author_user, text='Пост',
+                            group=self.group)
+        Post.objects.create(author=self.author_user, text='Ещё пост')
+        unread.fan_out_new()
+        self.assertEqual(unread.get_unread(
+            User.objects.get(pk=self.reader.pk)), 2)
+        self.assertEqual(unread.get_unread(
+            User.objects.get(pk=self.author_user.pk)), 0)
+
+    def test_fan_out_off_request_path(self):
+        """Публикация не трогает счётчики; команда раздаёт каждый пост
+        один раз."""
+        Post.objects.create(author=self.author_user, text='Пост')
+        self.assertFalse(FeedCursor.objects.exists())
+        out = StringIO()
+        call_command('fan_out_unread', stdout=out)
+        self.assertIn('1', out.getvalue())
+        call_command('fan_out_unread', stdout=StringIO())
+        self.assertEqual(unread.get_unread(
+            User.objects.get(pk=self.reader.pk)), 1)
+
+    def test_badge_costs_one_row_per_request(self):
+        Post.objects.create(author=self.author_user, text='Пост')
+        unread.fan_out_new()
+        user = User.objects.get(pk=self.reader.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(unread.get_unread(user), 1)
+            self.assertEqual(unread.get_unread(user), 1)
+
+    def test_badge_sees_other_processes(self):
+        """Счётчик не залипает в кэше воркера: изменения команды
+        fan_out_unread и других воркеров видны в следующем запросе."""
+        Post.objects.create(author=self.author_user, text='Пост')
+        unread.fan_out_new()
+        url = reverse('posts:group_slug', kwargs={'slug': self.group.slug})
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.context['unread_count'], 1)
+        # Так счётчик меняет процесс, чей кэш этому воркеру не виден.
+        FeedCursor.objects.filter(user=self.reader).update(unread_count=3)
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.context['unread_count'], 3)
+
+    def test_badge_not_shared_through_index_cache(self):
+        Post.objects.create(author=self.author_user, text='Пост')
+        unread.fan_out_new()
+        badge = '<span class="badge bg-danger">1</span>'
+        url = reverse('posts:index')
+        self.assertContains(self.authorized_client.get(url), badge)
+        author_client = Client()
+        author_client.force_login(self.author_user)
+        self.assertNotContains(author_client.get(url), badge)
+        self.assertNotContains(self.client.get(url), badge)
+
+    def test_feed_view_resets_counter(self):
+        """Лента показывает число новых постов и сбрасывает счётчик."""
+        Post.objects.create(author=self.author_user, text='Пост')
+        unread.fan_out_new()
+        url = reverse('posts:follow_index')
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Новых записей с прошлого визита: 1')
+        self.assertEqual(response.context['unread_count'], 0)
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, 'Новых записей с прошлого визита')
+        Post.objects.create(author=self.author_user, text='Свежий пост')
+        unread.fan_out_new()
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Новое')
+
+
+@override_settings(VIEW_COUNT_MAX_PENDING=3, VIEW_COUNT_FLUSH_INTERVAL=60)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Просмотры из других тестов уходят в пустую таблицу.
+        view_counts.counter.flush()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.other_post = Post.objects.create(author=cls.user,
+                                             text='Другой пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        view_counts.counter.flush()
+
+    def test_views_buffered_until_flush(self):
+        """Просмотры копятся в буфере и пишутся одним UPDATE."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:post_detail',
+                                    kwargs={'post_id': self.other_post.id}))
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('CASE', updates[0])
+        self.post.refresh_from_db()
+        self.other_post.refresh_from_db()
+        self.assertEqual((self.post.views, self.other_post.views), (2, 1))
+
+    @override_settings(WORKER_MAX_REQUESTS=1)
+    def test_flushed_before_recycle(self):
+        """Буфер пишется в БД до SIGTERM перезапуска воркера."""
+        view_counts.counter.add(self.post.id)
+        with mock.patch('core.middleware.os.kill') as kill:
+            with self.assertLogs('yatube.memory', 'WARNING'):
+                self.client.get(reverse('about:author'))
+        kill.assert_called_once()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 1)
+
+    def test_failed_flush_keeps_views(self):
+        view_counts.counter.add(self.post.id)
+        with mock.patch.object(view_counts, 'write',
+                               side_effect=DatabaseError):
+            view_counts.counter.flush()
+        view_counts.counter.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 1)
+
+
+class LikeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(username='IvanFakov')
+        cls.reader = User.objects.create_user(username='VasyaPupkin')
+        cls.post = Post.objects.create(author=cls.author_user,
+                                       text='Тестовый пост')
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author_user, text='Комментарий')
+        cls.busy_author = User.objects.create_user(username='PetyaSidorov')
+        Post.objects.bulk_create(
+            Post(author=cls.busy_author, text=f'Пост {number}')
+            for number in range(NUMBER_OF_POSTS_ON_PAGE))
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_like_is_unique(self):
+        url = reverse('posts:post_like', kwargs={'post_id': self.post.id})
+        self.authorized_client.post(url)
+        self.authorized_client.post(url)
+        self.assertEqual(PostLike.objects.filter(post=self.post).count(), 1)
+        self.assertEqual(likes.total('post', self.post.id), 1)
+        self.authorized_client.post(
+            reverse('posts:post_unlike', kwargs={'post_id': self.post.id}))
+        self.assertFalse(PostLike.objects.exists())
+        self.assertEqual(likes.total('post', self.post.id), 0)
+
+    @override_settings(LIKE_COUNTER_SHARDS=4)
+    def test_counter_spread_over_shards(self):
+        """Лайки расходятся по шардам, итог — их сумма."""
+        fans = User.objects.bulk_create(
+            User(username=f'fan{number}') for number in range(20))
+        for fan in User.objects.filter(username__startswith='fan'):
+            likes.like('post', fan, self.post)
+        self.assertLessEqual(
+            PostLikeCounter.objects.filter(post=self.post).count(), 4)
+        self.assertEqual(likes.total('post', self.post.id), len(fans))
+
+    def test_page_likes_in_constant_queries(self):
+        """Отметки зрителя для страницы постов не зависят от их числа."""
+        for post in Post.objects.filter(author=self.busy_author)[:3]:
+            likes.like('post', self.reader, post)
+        query_counts = []
+        for author in (self.author_user, self.busy_author):
+            url = reverse('posts:profile',
+                          kwargs={'username': author.username})
+            self.authorized_client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(url)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        page = response.context['page_obj']
+        self.assertEqual(sum(post.has_liked for post in page), 3)
+
+    def test_list_pages_without_totals(self):
+        """Итоги лайков видны только на странице поста: ETag списков
+        их не учитывает."""
+        likes.like('post', self.reader, self.post)
+        url = reverse('posts:profile',
+                      kwargs={'username': self.author_user.username})
+        etag = self.client.get(url)['ETag']
+        likes.like('post', self.author_user, self.post)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Нравится:')
+        self.assertFalse(hasattr(response.context['page_obj'][0],
+                                 'like_count'))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertContains(response, 'Нравится: 2')
+
+    def test_like_changes_post_etag(self):
+        """Лайк не меняет версию поста, но меняет ETag его страницы."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        likes.like('post', self.reader, self.post)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['post'].like_count, 1)
+
+    def test_comment_like(self):
+        self.authorized_client.post(reverse(
+            'posts:comment_like', kwargs={'comment_id': self.comment.id}))
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comment = response.context['comments'][0]
+        self.assertEqual(comment.like_count, 1)
+        self.assertTrue(comment.has_liked)
+
+    def test_index_not_shared_between_users(self):
+        """Отметки одного пользователя не попадают в главную другого."""
+        post = Post.objects.order_by('-pub_date').first()
+        likes.like('post', self.reader, post)
+        unlike_url = reverse('posts:post_unlike', kwargs={'post_id': post.id})
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, unlike_url)
+        other_client = Client()
+        other_client.force_login(self.author_user)
+        response = other_client.get(reverse('posts:index'))
+        self.assertNotContains(response, unlike_url)
+        self.assertNotContains(self.client.get(reverse('posts:index')),
+                               unlike_url)
+
+    def test_like_requires_login(self):
+        url = reverse('posts:post_like', kwargs={'post_id': self.post.id})
+        self.client.post(url)
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_like_requires_post_with_csrf(self):
+        """Ссылка GET не ставит лайк, а POST без CSRF-токена отклоняется."""
+        urls = [
+            reverse('posts:post_like', kwargs={'post_id': self.post.id}),
+            reverse('posts:comment_like',
+                    kwargs={'comment_id': self.comment.id}),
+        ]
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(self.reader)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(csrf_client.get(url).status_code, 405)
+                self.assertTemplateUsed(csrf_client.post(url),
+                                        'core/403csrf.html')
+        self.assertFalse(PostLike.objects.exists())
+        self.assertFalse(CommentLike.objects.exists())
+
+    def test_like_form_carries_csrf_token(self):
+        response = self.authorized_client.get(reverse(
+            'posts:profile', kwargs={'username': self.author_user.username}))
+        self.assertContains(response, 'method="post"', count=1)
+        self.assertContains(response, 'csrfmiddlewaretoken', count=1)
+
+
+class ThreadedCommentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='IvanFakov')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def reply(self, parent, text):
+        return Comment.objects.create(post=self.post, author=self.user,
+                                      parent=parent, text=text)
+
+    def test_threads_in_depth_first_order(self):
+        """Ветка идёт в глубину, ответы одного уровня — по времени."""
+        first = self.reply(None, 'Первый')
+        second = self.reply(None, 'Второй')
+        answer = self.reply(first, 'Ответ')
+        later = self.reply(first, 'Позже')
+        nested = self.reply(answer, 'Вложенный')
+        other = self.reply(second, 'Ответ второму')
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        # Сессия, пользователь, счётчик непрочитанного, версии, корни,
+        # ветки, лайки зрителя и счётчики.
+        with self.assertNumQueries(8):
+            comments = self.authorized_client.get(url).context['comments']
+        self.assertEqual(list(comments), [second, first])
+        self.assertEqual(comments[0].thread, [other])
+        self.assertEqual(comments[1].thread, [answer, nested, later])
+        self.assertEqual([c.depth for c in comments[1].thread], [1, 2, 1])
+
+    def test_depth_limit(self):
+        """Ответ на комментарий предельной глубины встаёт рядом с ним."""
+        comment = self.reply(None, 'Корень')
+        for level in range(COMMENT_MAX_DEPTH):
+            comment = self.reply(comment, f'Уровень {level + 1}')
+        deepest = self.reply(comment, 'Глубже')
+        self.assertEqual(deepest.depth, COMMENT_MAX_DEPTH)
+        self.assertEqual(deepest.parent_id, comment.parent_id)
+
+    def test_only_top_level_paginated(self):
+        roots = [self.reply(None, f'Корень {number}')
+                 for number in range(NUMBER_OF_COMMENTS_ON_PAGE + 1)]
+        for root in roots:
+            self.reply(root, 'Ответ')
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        comments = self.client.get(url).context['comments']
+        self.assertEqual(len(comments), NUMBER_OF_COMMENTS_ON_PAGE)
+        for root in comments:
+            self.assertEqual([reply.parent_id for reply in root.thread],
+                             [root.id])
+        rest = self.client.get(url, {'cursor': comments.next_cursor})
+        self.assertEqual(list(rest.context['comments']), [roots[0]])
+
+    def test_reply_form(self):
+        root = self.reply(None, 'Корень')
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Ответ', 'parent': root.id})
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual((reply.parent, reply.depth), (root, 1))
+
+    def test_reply_to_other_post_rejected(self):
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        foreign = Comment.objects.create(post=other_post, author=self.user,
+                                         text='Чужой')
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Ответ', 'parent': foreign.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_malformed_parent_rejected(self):
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Ответ', 'parent': 'abc'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text='Ответ').exists())
+
+
+class ViewCounterThreadTests(TransactionTestCase):
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL=0.05)
+    def test_idle_worker_flushes(self):
+        """Фоновый поток пишет просмотры без новых запросов."""
+        user = User.objects.create_user(username='IvanFakov')
+        post = Post.objects.create(author=user, text='Тестовый пост')
+        counter = view_counts.ViewCounter()
+        counter.add(post.id)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            post.refresh_from_db()
+            if post.views:
+                break
+            time.sleep(0.05)
+        counter.pid = None
+        self.assertEqual(post.views, 1)
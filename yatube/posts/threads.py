@@ -0,0 +1,66 @@
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+from .models import COMMENT_MAX_DEPTH, COMMENT_SEGMENT_WIDTH, Comment
+
+# Больше любой цифры: верхняя граница диапазона путей с общим префиксом.
+PATH_END = '~'
+
+
+def segment(comment_id):
+    return str(comment_id).zfill(COMMENT_SEGMENT_WIDTH)
+
+
+def place(comment):
+    """Заполняет path и depth ответа по родителю.
+
+    Ответ на комментарий предельной глубины становится ответом на его
+    родителя, чтобы ветка не уходила вправо бесконечно.
+    """
+    parent = comment.parent
+    if parent is None:
+        comment.path, comment.depth = '', 0
+        return
+    if parent.depth >= COMMENT_MAX_DEPTH:
+        comment.parent_id = parent.parent_id
+        comment.path, comment.depth = parent.path, parent.depth
+        return
+    comment.path = parent.path + segment(parent.pk)
+    comment.depth = parent.depth + 1
+
+
+def thread_order():
+    """Полный путь комментария: сортировка по нему обходит ветку
+    в глубину, ответы идут по времени."""
+    return Concat('path', LPad(Cast('id', CharField()),
+                               COMMENT_SEGMENT_WIDTH, Value('0')))
+
+
+def replies_in_range(post_id, first, last):
+    """Ответы на корневые комментарии с id от first до last одним
+    запросом по диапазону индекса (post, path)."""
+    return Comment.objects.filter(
+        post_id=post_id,
+        path__gte=segment(first),
+        path__lt=segment(last) + PATH_END,
+    ).select_related('author').order_by(thread_order())
+
+
+def attach_replies(post_id, roots):
+    """Раскладывает ответы по корням страницы в thread каждого корня.
+
+    Корни страницы идут подряд по id, поэтому их ветки читаются одним
+    запросом по диапазону путей; ветки других корней из того же
+    диапазона отбрасываются.
+    """
+    roots = list(roots)
+    threads = {segment(root.pk): [] for root in roots}
+    if roots:
+        ids = [root.pk for root in roots]
+        for reply in replies_in_range(post_id, min(ids), max(ids)):
+            thread = threads.get(reply.path[:COMMENT_SEGMENT_WIDTH])
+            if thread is not None:
+                thread.append(reply)
+    for root in roots:
+        root.thread = threads[segment(root.pk)]
+    return roots
@@ -0,0 +1,128 @@
+import datetime
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core import versions
+
+from .models import Comment, Follow, Post, TrendingCursor, TrendingPost
+
+EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+POST_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+FOLLOW_WEIGHT = 5.0
+# Ограничение SQLite на число параметров запроса.
+CHUNK_SIZE = 500
+
+
+def decay_rate():
+    return math.log(2) / settings.TRENDING_HALF_LIFE
+
+
+def log_weight(weight, moment):
+    """Логарифм веса события, приведённого к EPOCH: log(w) + λ·t."""
+    return math.log(weight) + decay_rate() * (
+        moment - EPOCH).total_seconds()
+
+
+def log_add(first, second):
+    """log(exp(first) + exp(second)) без переполнения."""
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def id_ranges():
+    """Необработанные диапазоны id (после прошлого запуска, до текущего)."""
+    last = dict(TrendingCursor.objects.values_list('name', 'last_id'))
+    ranges = {}
+    for name, model in (('post', Post), ('comment', Comment),
+                        ('follow', Follow)):
+        top = model.objects.aggregate(top=Max('id'))['top'] or 0
+        ranges[name] = (last.get(name, 0), max(top, last.get(name, 0)))
+    return ranges
+
+
+def collect_gains(ranges, since):
+    """Логарифмы прироста рейтинга по постам от новых событий."""
+    gains = {}
+
+    def add(post_id, weight, moment):
+        gains[post_id] = log_add(gains.get(post_id),
+                                 log_weight(weight, moment))
+
+    low, high = ranges['post']
+    posts = Post.objects.filter(
+        id__gt=low, id__lte=high, pub_date__gte=since).values_list(
+        'id', 'pub_date')
+    for post_id, pub_date in posts.iterator():
+        add(post_id, POST_WEIGHT, pub_date)
+    low, high = ranges['comment']
+    comments = Comment.objects.filter(
+        id__gt=low, id__lte=high, created__gte=since).values_list(
+        'post_id', 'created')
+    for post_id, created in comments.iterator():
+        add(post_id, COMMENT_WEIGHT, created)
+    # Подписка засчитывается последнему свежему посту автора.
+    low, high = ranges['follow']
+    follows = list(Follow.objects.filter(
+        id__gt=low, id__lte=high, created__gte=since).values_list(
+        'author_id', 'created'))
+    latest = {}
+    for authors in chunks({author_id for author_id, _ in follows}):
+        for author_id, post_id in Post.objects.filter(
+                author_id__in=authors, pub_date__gte=since).order_by(
+                'author_id', '-pub_date').values_list('author_id', 'id'):
+            latest.setdefault(author_id, post_id)
+    for author_id, created in follows:
+        if author_id in latest:
+            add(latest[author_id], FOLLOW_WEIGHT, created)
+    return gains
+
+
+def update(now=None):
+    """Добавляет в рейтинг события с прошлого запуска.
+
+    Старые вклады не пересчитываются: в логарифмической шкале новое
+    событие просто прибавляется к сумме. Удалённые комментарии из
+    рейтинга не вычитаются, посты старше TRENDING_WINDOW выбывают.
+    Возвращает число обновлённых постов.
+    """
+    since = (now or timezone.now()) - datetime.timedelta(
+        seconds=settings.TRENDING_WINDOW)
+    with transaction.atomic():
+        ranges = id_ranges()
+        gains = collect_gains(ranges, since)
+        updated, created = [], []
+        for post_ids in chunks(gains):
+            fresh = Post.objects.filter(
+                id__in=post_ids, pub_date__gte=since).values_list(
+                'id', flat=True)
+            existing = TrendingPost.objects.in_bulk(post_ids)
+            for post_id in fresh:
+                entry = existing.get(post_id)
+                if entry is None:
+                    created.append(
+                        TrendingPost(post_id=post_id, score=gains[post_id]))
+                else:
+                    entry.score = log_add(entry.score, gains[post_id])
+                    updated.append(entry)
+        TrendingPost.objects.bulk_create(created, batch_size=CHUNK_SIZE)
+        TrendingPost.objects.bulk_update(
+            updated, ['score'], batch_size=CHUNK_SIZE)
+        TrendingPost.objects.filter(post__pub_date__lt=since).delete()
+        for name, (_, high) in ranges.items():
+            TrendingCursor.objects.update_or_create(
+                name=name, defaults={'last_id': high})
+        versions.bump('trending')
+    return len(created) + len(updated)
@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FanOutCursor, FeedCursor, Follow, GroupFollow, Post
+
+BATCH_SIZE = 200
+# Ограничение SQLite на число параметров запроса.
+CHUNK_SIZE = 500
+
+
+def get_unread(user):
+    """Число непрочитанных постов: строка FeedCursor по первичному ключу.
+
+    Кэш процесса здесь не годится: счётчик меняют команда fan_out_unread
+    и другие воркеры. Значение запоминается на время запроса.
+    """
+    if not hasattr(user, '_unread_count'):
+        user._unread_count = FeedCursor.objects.filter(
+            pk=user.pk).values_list('unread_count', flat=True).first() or 0
+    return user._unread_count
+
+
+def last_read_at(user):
+    return FeedCursor.objects.filter(user=user).values_list(
+        'last_read_at', flat=True).first()
+
+
+def fan_out(post):
+    """Увеличивает счётчики подписчиков автора и группы нового поста.
+
+    Удаление поста и отписка счётчики не уменьшают: расхождение
+    исчезает при следующем просмотре ленты.
+    """
+    readers = set(Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True))
+    if post.group_id:
+        readers.update(GroupFollow.objects.filter(
+            group_id=post.group_id).values_list('user_id', flat=True))
+    readers.discard(post.author_id)
+    readers = sorted(readers)
+    for start in range(0, len(readers), CHUNK_SIZE):
+        chunk = readers[start:start + CHUNK_SIZE]
+        FeedCursor.objects.bulk_create(
+            [FeedCursor(user_id=user_id) for user_id in chunk],
+            ignore_conflicts=True)
+        FeedCursor.objects.filter(user_id__in=chunk).update(
+            unread_count=F('unread_count') + 1)
+
+
+def fan_out_new():
+    """Раздаёт счётчики по постам, появившимся после прошлого запуска,
+    и возвращает их число.
+
+    Запускается командой fan_out_unread по расписанию: публикация поста
+    не ждёт обхода подписчиков автора и группы.
+    """
+    cursor, _ = FanOutCursor.objects.get_or_create(pk=FanOutCursor.PK)
+    handled = 0
+    while True:
+        posts = list(Post.objects.filter(id__gt=cursor.last_id).order_by(
+            'id').only('id', 'author_id', 'group_id')[:BATCH_SIZE])
+        if not posts:
+            return handled
+        with transaction.atomic():
+            for post in posts:
+                fan_out(post)
+            cursor.last_id = posts[-1].pk
+            cursor.save(update_fields=['last_id'])
+        handled += len(posts)
+
+
+def mark_read(user):
+    """Сбрасывает счётчик; возвращает (число, время прошлого прочтения)."""
+    count = get_unread(user)
+    if not count:
+        return 0, None
+    since = last_read_at(user)
+    FeedCursor.objects.filter(user=user).update(
+        unread_count=0, last_read_at=timezone.now())
+    user._unread_count = 0
+    return count, since
@@ -1,11 +1,13 @@
-from django.urls import path
+from django.urls import path, re_path
 
-from . import views
+from . import sitemaps, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('trending/', views.trending, name='trending'),
+    path('groups/', views.groups, name='groups'),
     path('group/<slug:slug>/', views.group_posts, name='group_slug'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
@@ -13,9 +15,41 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('posts/<int:post_id>/like/', views.post_like, name='post_like'),
+    path('posts/<int:post_id>/unlike/', views.post_unlike,
+         name='post_unlike'),
+    path('comments/<int:comment_id>/like/', views.comment_like,
+         name='comment_like'),
+    path('comments/<int:comment_id>/unlike/', views.comment_unlike,
+         name='comment_unlike'),
+    path('tag/<str:name>/', views.tag_posts, name='tag'),
+    path('mentions/', views.mentions, name='mentions'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('group/<slug:slug>/follow/', views.group_follow,
+         name='group_follow'),
+    path('group/<slug:slug>/unfollow/', views.group_unfollow,
+         name='group_unfollow'),
+    path('profile/<str:username>/followers/', views.followers,
+         name='followers'),
+    path('profile/<str:username>/following/', views.following,
+         name='following'),
     path('profile/<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
          name='profile_unfollow'),
+    path('feeds/rss/', views.latest_posts_feed, name='feed_rss'),
+    path('feeds/atom/', views.latest_posts_atom_feed, name='feed_atom'),
+    path('group/<slug:slug>/rss/', views.group_posts_feed,
+         name='group_feed_rss'),
+    path('group/<slug:slug>/atom/', views.group_posts_atom_feed,
+         name='group_feed_atom'),
+    path('profile/<str:username>/rss/', views.author_posts_feed,
+         name='profile_feed_rss'),
+    path('profile/<str:username>/atom/', views.author_posts_atom_feed,
+         name='profile_feed_atom'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    re_path(rf'^sitemaps/(?P<name>{sitemaps.SHARD_NAME_RE})$',
+            views.sitemap_shard, name='sitemap_shard'),
 ]
@@ -0,0 +1,123 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from .models import Post
+
+logger = logging.getLogger('yatube.view_counts')
+
+# Три параметра на пост: WHEN, THEN и IN. Ограничение SQLite — 999.
+CHUNK_SIZE = 300
+
+
+def write(pending):
+    """Прибавляет просмотры одним UPDATE ... CASE на пачку постов."""
+    post_ids = sorted(pending)
+    for start in range(0, len(post_ids), CHUNK_SIZE):
+        chunk = post_ids[start:start + CHUNK_SIZE]
+        Post.objects.filter(id__in=chunk).update(views=F('views') + Case(
+            *(When(id=post_id, then=Value(pending[post_id]))
+              for post_id in chunk),
+            default=Value(0),
+            output_field=PositiveIntegerField(),
+        ))
+
+
+class ViewCounter:
+    """Буфер просмотров постов в памяти процесса.
+
+    Сбрасывается в БД после VIEW_COUNT_MAX_PENDING просмотров и раз
+    в VIEW_COUNT_FLUSH_INTERVAL секунд фоновым потоком, даже если
+    просмотров больше нет, а также перед перезапуском воркера и при
+    выходе. При падении воркера теряется не больше интервала.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self._reset()
+
+    def _reset(self):
+        self.pending = Counter()
+        self.total = 0
+        self.last_flush = time.monotonic()
+
+    def _ensure_process(self):
+        # После fork буфер родителя принадлежит родителю.
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self._reset()
+            self._start_thread()
+
+    def _start_thread(self):
+        # Потоки не переживают fork: у каждого процесса свой.
+        if not settings.VIEW_COUNT_FLUSH_INTERVAL:
+            return
+        self.thread = threading.Thread(
+            target=self._run, name='view-counts-flush', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self.pid == pid:
+            time.sleep(settings.VIEW_COUNT_FLUSH_INTERVAL)
+            self.flush_if_due()
+            # Соединения потока не ждут закрытия по запросу.
+            connections.close_all()
+
+    def add(self, post_id):
+        with self.lock:
+            self._ensure_process()
+            self.pending[post_id] += 1
+            self.total += 1
+
+    def due(self):
+        return self.total and (
+            self.total >= settings.VIEW_COUNT_MAX_PENDING
+            or time.monotonic() - self.last_flush
+            >= settings.VIEW_COUNT_FLUSH_INTERVAL)
+
+    def flush_if_due(self):
+        if self.due():
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self._ensure_process()
+            pending = self.pending
+            self._reset()
+        if not pending:
+            return
+        try:
+            write(pending)
+        except DatabaseError:
+            logger.exception('view counts flush failed, retrying later')
+            with self.lock:
+                self.pending.update(pending)
+                self.total += sum(pending.values())
+
+
+counter = ViewCounter()
+
+
+@atexit.register
+def flush_at_exit():
+    # При выходе БД может быть уже недоступна: просмотры теряются,
+    # но завершение процесса не должно падать.
+    try:
+        counter.flush()
+    except Exception as error:
+        logger.warning('view counts lost at exit: %r', error)
+
+
+def record(post_id):
+    counter.add(post_id)
+    counter.flush_if_due()
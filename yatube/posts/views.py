@@ -1,13 +1,32 @@
+import gzip
+import os
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
+from django.views.decorators.vary import vary_on_headers
 
+from . import feeds, likes, markup, sitemaps, threads
+from .decorators import (FRAGMENT_HEADER, cache_page_for_guests,
+                         conditional_page, counts_post_views, is_fragment,
+                         marks_feed_read)
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from .models import (Comment, Follow, FollowSuggestion, Group, GroupFollow,
+                     Post, PostMention, PostTag, TrendingPost)
+from .pagination import InvalidCursor, keyset_page, merged_keyset_page
+from .suggestions import SUGGESTIONS_PER_USER
 
 NUMBER_OF_POSTS_ON_PAGE = 10
+NUMBER_OF_COMMENTS_ON_PAGE = 20
+NUMBER_OF_GROUPS_ON_PAGE = 20
+NUMBER_OF_USERS_ON_PAGE = 50
+FEED_CACHE_TIMEOUT = 60 * 60
+FOLLOW_CACHE_TIMEOUT = 60 * 5
 User = get_user_model()
 
 
@@ -15,14 +34,149 @@ def get_page_obj(request, post_list):
     paginator = Paginator(post_list, NUMBER_OF_POSTS_ON_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = with_likes(request, page_obj.object_list)
     return page_obj
 
 
-@cache_page(20, key_prefix='index_cache')
+def with_likes(request, posts, kind='post', totals=False):
+    """Отметки зрителя для всей страницы сразу.
+
+    Итоги лайков читаются только с totals: их видно лишь на странице
+    поста, ETag которой их учитывает.
+    """
+    return likes.annotate(kind, posts, request.user, totals)
+
+
+def get_keyset_page(request, queryset, per_page, fields=('pub_date', 'id')):
+    try:
+        return keyset_page(queryset, request.GET.get('cursor'), per_page,
+                           fields)
+    except InvalidCursor:
+        raise Http404('Неверный курсор.')
+
+
+def get_comments_page(request, post_id):
+    """Страница корневых комментариев с их ветками: два запроса на
+    страницу независимо от числа ответов."""
+    comments = Comment.objects.filter(
+        post_id=post_id, depth=0).select_related('author')
+    page = get_keyset_page(request, comments, NUMBER_OF_COMMENTS_ON_PAGE,
+                           fields=('created', 'id'))
+    threads.attach_replies(post_id, page.object_list)
+    with_likes(request, [
+        comment
+        for root in page.object_list
+        for comment in (root, *root.thread)
+    ], 'comment', totals=True)
+    return page
+
+
+def save_comment(request, post, form):
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    parent_id = request.POST.get('parent')
+    if parent_id:
+        if not parent_id.isdigit():
+            raise Http404('Некорректный комментарий-родитель.')
+        comment.parent = get_object_or_404(Comment, pk=parent_id, post=post)
+    comment.save()
+    return comment
+
+
+def render_post_fragment(request, post_list, page=None):
+    """Только список постов и курсор следующей порции, без base.html."""
+    template = 'includes/post_list.html'
+    if page is None:
+        page = get_keyset_page(request, post_list, NUMBER_OF_POSTS_ON_PAGE)
+    page.object_list = with_likes(request, page.object_list)
+    response = render(request, template, {'page': page})
+    if page.has_next:
+        response['X-Next-Cursor'] = page.next_cursor
+    return response
+
+
+def index_keys(request):
+    return ['index']
+
+
+def group_keys(request, slug):
+    keys = [f'group:{slug}']
+    if request.user.is_authenticated:
+        keys.append(f'follows:{request.user.pk}')
+    return keys
+
+
+def profile_keys(request, username):
+    keys = [f'author:{username}', f'user:{username}']
+    if request.user.is_authenticated:
+        keys.append(f'follows:{request.user.pk}')
+    return keys
+
+
+def post_keys(request, post_id):
+    return [f'post:{post_id}']
+
+
+def post_like_state(request, post_id):
+    return (likes.total('post', post_id),)
+
+
+def trending_keys(request):
+    # index меняется при правке и удалении любого поста.
+    return ['trending', 'index']
+
+
+def tag_keys(request, name):
+    return [f'tag:{markup.normalize_tag(name)}']
+
+
+def mentions_keys(request):
+    return [f'mentions:{request.user.pk}']
+
+
+def follow_list_keys(kind):
+    def get_keys(request, username):
+        keys = [f'{kind}:{username}']
+        if request.user.is_authenticated:
+            keys.append(f'follows:{request.user.pk}')
+        return keys
+    return get_keys
+
+
+def groups_keys(request):
+    # Счётчики групп меняются вместе с постами.
+    return ['index']
+
+
+def get_follow_sources(request):
+    """Авторы и группы, на которые подписан пользователь: (id, ключ)."""
+    if not hasattr(request, '_follow_sources'):
+        authors = Follow.objects.filter(user=request.user).values_list(
+            'author_id', 'author__username').distinct()
+        groups = GroupFollow.objects.filter(user=request.user).values_list(
+            'group_id', 'group__slug')
+        request._follow_sources = list(authors), list(groups)
+    return request._follow_sources
+
+
+def follow_keys(request):
+    authors, groups = get_follow_sources(request)
+    return [f'follows:{request.user.pk}', f'suggestions:{request.user.pk}',
+            *(f'author:{username}' for _, username in authors),
+            *(f'group:{slug}' for _, slug in groups)]
+
+
+@conditional_page(index_keys)
+@cache_page_for_guests(20, key_prefix='index_cache')
+@vary_on_headers(FRAGMENT_HEADER)
 def index(request):
     template = 'posts/index.html'
     post_list = (
-        Post.objects.select_related('group').all().order_by('-pub_date'))
+        Post.objects.select_related('author', 'group').all()
+        .order_by('-pub_date'))
+    if is_fragment(request):
+        return render_post_fragment(request, post_list)
     page_obj = get_page_obj(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -30,22 +184,92 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional_page(trending_keys)
+def trending(request):
+    template = 'posts/trending.html'
+    entries = TrendingPost.objects.select_related(
+        'post__author', 'post__group')
+    page = get_keyset_page(request, entries, NUMBER_OF_POSTS_ON_PAGE,
+                           fields=('score', 'post_id'))
+    with_likes(request, [entry.post for entry in page])
+    context = {
+        'page': page,
+    }
+    return render(request, template, context)
+
+
+def render_post_entries(request, entries, title):
+    """Страница постов из строк индекса (тег, упоминание) по курсору
+    (pub_date, post_id) без соединения по условию с постами."""
+    page = get_keyset_page(
+        request, entries.select_related('post__author', 'post__group'),
+        NUMBER_OF_POSTS_ON_PAGE, fields=('pub_date', 'post_id'))
+    with_likes(request, [entry.post for entry in page])
+    template = 'posts/post_entries.html'
+    context = {
+        'title': title,
+        'page': page,
+    }
+    return render(request, template, context)
+
+
+@conditional_page(tag_keys)
+def tag_posts(request, name):
+    tag = markup.normalize_tag(name)
+    return render_post_entries(
+        request, PostTag.objects.filter(tag=tag), f'#{tag}')
+
+
+@login_required
+@conditional_page(mentions_keys, public=False)
+def mentions(request):
+    return render_post_entries(
+        request, PostMention.objects.filter(user=request.user),
+        'Упоминания')
+
+
+@conditional_page(groups_keys)
+def groups(request):
+    template = 'posts/groups.html'
+    group_list = Group.objects.order_by('-last_post_at', '-id')
+    paginator = Paginator(group_list, NUMBER_OF_GROUPS_ON_PAGE)
+    context = {
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, template, context)
+
+
+@conditional_page(group_keys)
+@vary_on_headers(FRAGMENT_HEADER)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     template = 'posts/group_list.html'
-    post_list = Post.objects.filter(group=group).order_by('-pub_date')
+    post_list = Post.objects.filter(group=group).select_related(
+        'author', 'group').order_by('-pub_date')
+    if is_fragment(request):
+        return render_post_fragment(request, post_list)
     page_obj = get_page_obj(request, post_list)
+    following = False
+    if request.user.is_authenticated:
+        following = GroupFollow.objects.filter(
+            user=request.user, group=group).exists()
     context = {
         'group': group,
         'page_obj': page_obj,
+        'following': following,
     }
     return render(request, template, context)
 
 
+@conditional_page(profile_keys)
+@vary_on_headers(FRAGMENT_HEADER)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     template = 'posts/profile.html'
-    post_list = Post.objects.filter(author=author).order_by('-pub_date')
+    post_list = Post.objects.filter(author=author).select_related(
+        'author', 'group').order_by('-pub_date')
+    if is_fragment(request):
+        return render_post_fragment(request, post_list)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -59,20 +283,35 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@counts_post_views
+@conditional_page(post_keys, get_state=post_like_state)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    with_likes(request, [post], totals=True)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
-    comments = Comment.objects.filter(post=post).order_by('-created')
+        save_comment(request, post, form)
+    reply_to = None
+    if request.GET.get('reply', '').isdigit():
+        reply_to = Comment.objects.select_related('author').filter(
+            pk=request.GET['reply'], post=post).first()
     template = 'posts/post_detail.html'
     context = {
         'post': post,
         'form': form,
-        'comments': comments,
+        'comments': get_comments_page(request, post.id),
+        'reply_to': reply_to,
+    }
+    return render(request, template, context)
+
+
+@conditional_page(post_keys)
+def post_comments(request, post_id):
+    template = 'includes/comment_list.html'
+    context = {
+        'post_id': post_id,
+        'comments': get_comments_page(request, post_id),
     }
     return render(request, template, context)
 
@@ -105,7 +344,10 @@ def post_edit(request, post_id):
     if request.user != post.author:
         return redirect('posts:post_detail', post_id)
     if request.method == 'POST' and form.is_valid():
-        post.save()
+        # views не сохраняется: иначе затрутся просмотры, записанные
+        # после загрузки поста.
+        post.save(update_fields=[
+            *PostForm.Meta.fields, 'text_html', 'renderer_version'])
         return redirect('posts:post_detail', post_id)
     context = {
         'post_id': post_id,
@@ -120,25 +362,109 @@ def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        save_comment(request, post, form)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def follow_posts(user):
+    """Посты авторов и групп, на которые подписан пользователь.
+
+    OR по подзапросам не читает ленту по индексам: годится для подсчёта
+    новых постов по id, а страницы ленты строит follow_streams.
+    """
+    authors = Follow.objects.filter(user=user).values('author_id')
+    groups = GroupFollow.objects.filter(user=user).values('group_id')
+    return Post.objects.filter(
+        Q(author_id__in=authors) | Q(group_id__in=groups))
+
+
+def follow_streams(request):
+    """Ленты подписок: по одной на автора и группу, каждая читается
+    по индексу (автор или группа, pub_date, id)."""
+    authors, groups = get_follow_sources(request)
+    return ([Q(author_id=author_id) for author_id, _ in authors]
+            + [Q(group_id=group_id) for group_id, _ in groups])
+
+
+def get_follow_page(request):
+    """Лента подписок: слияние лент авторов и групп по курсору."""
+    posts = Post.objects.select_related('author', 'group')
+    try:
+        return merged_keyset_page(posts, follow_streams(request),
+                                  request.GET.get('cursor'),
+                                  NUMBER_OF_POSTS_ON_PAGE)
+    except InvalidCursor:
+        raise Http404('Неверный курсор.')
+
+
 @login_required
+@marks_feed_read
+@conditional_page(follow_keys, public=False,
+                  cache_timeout=FOLLOW_CACHE_TIMEOUT)
+@vary_on_headers(FRAGMENT_HEADER)
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = Post.objects.filter(
-        author__following__user=request.user).order_by('-pub_date')
-    page_obj = get_page_obj(request, post_list)
+    page = get_follow_page(request)
+    if is_fragment(request):
+        return render_post_fragment(request, None, page)
+    # page_obj остаётся Page: шаблон и пагинатор ждут этот тип.
+    page_obj = Paginator(with_likes(request, page.object_list),
+                         NUMBER_OF_POSTS_ON_PAGE).page(1)
+    # Подсказки считаются по расписанию: подписки, оформленные после
+    # расчёта, отсекаются при чтении.
+    suggestions = FollowSuggestion.objects.filter(
+        user=request.user).exclude(
+        author_id__in=Follow.objects.filter(
+            user=request.user).values('author_id')).select_related(
+        'author').order_by('-score')
     context = {
         'page_obj': page_obj,
+        'next_cursor': page.next_cursor,
+        'unread_before': request.unread_before,
+        'unread_since': request.unread_since,
+        'suggestions': suggestions[:SUGGESTIONS_PER_USER],
     }
     return render(request, template, context)
 
 
+def render_follow_list(request, author, follows, related, title):
+    """Страница пользователей из подписок follows и состояние подписки
+    зрителя на каждого из них одним запросом."""
+    page = get_keyset_page(
+        request, follows.select_related(related), NUMBER_OF_USERS_ON_PAGE,
+        fields=('created', 'id'))
+    users = [getattr(follow, related) for follow in page]
+    followed = set()
+    if request.user.is_authenticated:
+        followed = set(Follow.objects.filter(
+            user=request.user, author__in=users).values_list(
+            'author_id', flat=True))
+    template = 'posts/follow_list.html'
+    context = {
+        'author': author,
+        'title': title,
+        'page': page,
+        'users': [(user, user.pk in followed) for user in users],
+    }
+    return render(request, template, context)
+
+
+@conditional_page(follow_list_keys('followers'))
+def followers(request, username):
+    author = get_object_or_404(User, username=username)
+    return render_follow_list(
+        request, author, Follow.objects.filter(author=author), 'user',
+        'Подписчики')
+
+
+@conditional_page(follow_list_keys('following'))
+def following(request, username):
+    author = get_object_or_404(User, username=username)
+    return render_follow_list(
+        request, author, Follow.objects.filter(user=author), 'author',
+        'Подписки')
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -158,3 +484,90 @@ def profile_unfollow(request, username):
         return redirect('posts:profile', username=request.user.username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=request.user.username)
+
+
+@login_required
+def group_follow(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    GroupFollow.objects.get_or_create(user=request.user, group=group)
+    return redirect('posts:group_slug', slug=slug)
+
+
+@login_required
+def group_unfollow(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    GroupFollow.objects.filter(user=request.user, group=group).delete()
+    return redirect('posts:group_slug', slug=slug)
+
+
+@require_POST
+@login_required
+def post_like(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    likes.like('post', request.user, post)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@require_POST
+@login_required
+def post_unlike(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    likes.unlike('post', request.user, post)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@require_POST
+@login_required
+def comment_like(request, comment_id):
+    comment = get_object_or_404(Comment, pk=comment_id)
+    likes.like('comment', request.user, comment)
+    return redirect('posts:post_detail', post_id=comment.post_id)
+
+
+@require_POST
+@login_required
+def comment_unlike(request, comment_id):
+    comment = get_object_or_404(Comment, pk=comment_id)
+    likes.unlike('comment', request.user, comment)
+    return redirect('posts:post_detail', post_id=comment.post_id)
+
+
+def open_sitemap(name, opener=open):
+    try:
+        return opener(os.path.join(settings.SITEMAP_DIR, name), 'rb')
+    except FileNotFoundError:
+        raise Http404('Карта сайта ещё не собрана.')
+
+
+@vary_on_headers('Accept-Encoding')
+def sitemap_index(request):
+    if 'gzip' not in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        # gzip.open владеет файлом: закрытие ответа закрывает и его.
+        return StreamingHttpResponse(
+            open_sitemap(sitemaps.INDEX_NAME, gzip.open),
+            content_type='application/xml')
+    response = FileResponse(open_sitemap(sitemaps.INDEX_NAME),
+                            content_type='application/xml')
+    response['Content-Encoding'] = 'gzip'
+    return response
+
+
+def sitemap_shard(request, name):
+    return FileResponse(open_sitemap(name), content_type='application/gzip')
+
+
+latest_posts_feed = conditional_page(
+    index_keys, cache_timeout=FEED_CACHE_TIMEOUT)(feeds.LatestPostsFeed())
+latest_posts_atom_feed = conditional_page(
+    index_keys, cache_timeout=FEED_CACHE_TIMEOUT)(
+    feeds.LatestPostsAtomFeed())
+group_posts_feed = conditional_page(
+    group_keys, cache_timeout=FEED_CACHE_TIMEOUT)(feeds.GroupPostsFeed())
+group_posts_atom_feed = conditional_page(
+    group_keys, cache_timeout=FEED_CACHE_TIMEOUT)(
+    feeds.GroupPostsAtomFeed())
+author_posts_feed = conditional_page(
+    profile_keys, cache_timeout=FEED_CACHE_TIMEOUT)(feeds.AuthorPostsFeed())
+author_posts_atom_feed = conditional_page(
+    profile_keys, cache_timeout=FEED_CACHE_TIMEOUT)(
+    feeds.AuthorPostsAtomFeed())
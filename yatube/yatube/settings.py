@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -53,6 +54,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
+    'core.middleware.SamplingProfilerMiddleware',
+    'core.middleware.WorkerRecycleMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,7 +72,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,6 +82,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'posts.context_processors.unread',
             ],
         },
     },
@@ -151,10 +156,82 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.LocMemCache',
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+SLOW_REQUEST_THRESHOLD_MS = 500
+
+SLOW_QUERY_THRESHOLD_MS = 100
+
+SPOOL_DIR = os.path.join(BASE_DIR, 'spool')
+
+TEST_RUNNER = 'core.runner.TempSpoolRunner'
+
+METRICS_FLUSH_INTERVAL = 5
+
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Профилировать каждый N-й запрос; 0 — только по заголовку X-Profile.
+PROFILING_SAMPLE_RATE = 0
+
+# cprofile — pstats-файлы, sampler — collapsed stacks для flamegraph.
+PROFILING_MODE = 'cprofile'
+
+PROFILING_SAMPLE_INTERVAL = 0.005
+
+PROFILING_TOKEN_MAX_AGE = 60 * 60 * 24
+
+# Запускать tracemalloc при старте процесса.
+MEMORY_TRACE = False
+
+MEMORY_TRACE_FRAMES = 1
+
+# Имя сигнала для записи отчёта о памяти в лог, например 'SIGUSR2'.
+MEMORY_REPORT_SIGNAL = None
+
+# Перезапуск воркера; 0 — без ограничения.
+WORKER_MAX_REQUESTS = 0
+
+WORKER_MAX_REQUESTS_JITTER = 0
+
+WORKER_MAX_RSS_MB = 0
+
+# Кэш указателей на последний пост ленты, секунд.
+FEED_HEAD_TIMEOUT = 5
+
+# Long-poll новых постов: максимальное ожидание и шаг проверки, секунд.
+DELTA_POLL_MAX_WAIT = 25
+
+DELTA_POLL_INTERVAL = 0.5
+
+SITEMAP_DIR = os.path.join(BASE_DIR, 'sitemaps')
+
+# Не больше 50 000 адресов в файле по протоколу sitemaps.org.
+SITEMAP_SHARD_SIZE = 50000
+
+SITEMAP_BASE_URL = 'https://ocronis.pythonanywhere.com'
+
+# Просмотры постов копятся в памяти воркера и пишутся в БД пачкой.
+VIEW_COUNT_FLUSH_INTERVAL = 10
+
+VIEW_COUNT_MAX_PENDING = 1000
+
+EXPORT_DIR = os.path.join(BASE_DIR, 'export')
+
+# Рейтинг популярных постов: период полураспада активности и возраст,
+# после которого пост выбывает из рейтинга, секунд.
+TRENDING_HALF_LIFE = 60 * 60 * 12
+
+TRENDING_WINDOW = 60 * 60 * 24 * 7
+
+# Число строк-шардов счётчика лайков одного поста или комментария.
+LIKE_COUNTER_SHARDS = 8
+
+THUMBNAIL_BACKEND = 'core.thumbnail.ThumbnailBackend'